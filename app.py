@@ -6,6 +6,12 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv(override=True)
 
+# Imported after load_dotenv: utils modules read their settings from the environment on import
+from utils.warmer import start_cache_warmer
+
+# Keeps hot quotes and retriever contexts fresh; started once per server process
+start_cache_warmer()
+
 app_logger = logging.getLogger("app")
 app_logger.setLevel(logging.ERROR)
 
@@ -1,3 +1,4 @@
+import os
 import logging
 copilot_logger = logging.getLogger("copilot")
 copilot_logger.setLevel(logging.ERROR)
@@ -15,55 +16,145 @@ ss = st.session_state
 
 from utils.prompts import react_prompt
 
-from langchain_openai import ChatOpenAI
+from utils.llm import get_chat_model, key_fingerprint
 
 from langchain.agents import create_react_agent, AgentExecutor
 
 from openai._exceptions import RateLimitError
 
 from utils.tools import (
-    retrieval_tool, get_current_stock_price
+    retrieval_tool, get_current_stock_price, get_price_history_analysis
 )
 
-from chat.memory import create_react_agent_memory
+from utils.memo import new_tool_memo, memoize_tools
+
+from chat.memory import ConversationMemory, llm_summarizer, render_turn
+from chat.streaming import TurnMetricsHandler, add_turn_timings
+from chat.router import intent_router
+
+
+# Guards against an agent that keeps looping: after either budget the
+# agent stops and the turn returns what its tools found so far
+AGENT_MAX_ITERATIONS = int(os.environ.get("AGENT_MAX_ITERATIONS", 6))
+AGENT_MAX_EXECUTION_SECONDS = float(os.environ.get("AGENT_MAX_EXECUTION_SECONDS", 90))
+
+# AgentExecutor's output when early_stopping_method="force" kicks in
+_STOPPED_OUTPUT = "Agent stopped due to iteration limit or time limit."
+
+# Recent turns sent as plain history when the conversation memory is unavailable
+MEMORY_FALLBACK_TURNS = 3
+
+
+def get_agent_executor(configurations):
+    """
+    Return this session's AgentExecutor, building it only when the session
+    has none yet or the OpenAI key changed. Executors hold no per-turn state.
+    """
+    executor_key = key_fingerprint(configurations["openai_api_key"])
+
+    if ss.get("agent_executor_key") != executor_key:
+        model = get_chat_model(configurations["openai_api_key"], streaming=True)
+
+        # Tool results are memoized for the session (see utils.memo)
+        ss.tool_memo = new_tool_memo()
+        tools = memoize_tools(
+            [get_current_stock_price, get_price_history_analysis, retrieval_tool], ss.tool_memo
+        )
+
+        agent = create_react_agent(
+            llm=model,
+            tools=tools,
+            prompt=react_prompt
+        )
+
+        ss.agent_executor = AgentExecutor(
+            agent=agent,
+            tools=tools,
+            handle_parsing_errors=True,
+            max_iterations=AGENT_MAX_ITERATIONS,
+            max_execution_time=AGENT_MAX_EXECUTION_SECONDS,
+            early_stopping_method="force",
+            return_intermediate_steps=True
+        )
+        ss.agent_executor_key = executor_key
+
+    return ss.agent_executor
+
+
+def partial_answer(intermediate_steps):
+    """Answer for a turn the agent did not finish, built from its last tool result."""
+    for action, observation in reversed(intermediate_steps):
+        if action.tool in ("_Exception", "_invalid_tool"):
+            continue
+        return (
+            "I couldn't finish reasoning about this within my time budget, "
+            f"but here is what I found with {action.tool}:\n\n{observation}"
+        )
+    return (
+        "I couldn't finish reasoning about this within my time budget. "
+        "Please try asking a more specific question."
+    )
 
 
-def get_response(query, configurations, chat_history):
+def get_response(query, configurations, chat_history, callbacks=None):
+    """
+    Run one chat turn through the ReAct agent. callbacks (e.g. a
+    StreamlitAgentHandler) receive the agent's steps and LLM tokens as they
+    are produced. LLM and tool call counts for the turn, and the first-token
+    timings of a StreamlitAgentHandler, are kept in ss.last_turn_metrics.
+    """
 
     if "error_message" in ss:
         del ss["error_message"]
         query = ss.messages[-1]["message"]
 
 
-    model = ChatOpenAI(model="gpt-3.5-turbo-16k", openai_api_key=configurations["openai_api_key"])
-
-    tools = [get_current_stock_price, retrieval_tool]
-
-    agent = create_react_agent(
-        llm=model,
-        tools=tools,
-        prompt=react_prompt
-    )
-
-    memory = create_react_agent_memory(chat_history=chat_history)
-
-    agent_executor = AgentExecutor(agent=agent, tools=tools, handle_parsing_errors=True)
+    # Simple lookups (stock price, latest 10-K/10-Q) skip the agent entirely
+    routed_answer = intent_router.route(query, configurations)
+    if routed_answer is not None:
+        ss.last_turn_metrics = add_turn_timings({"llm_calls": 0, "tool_calls": 1, "routed": True}, callbacks)
+        chat_history.append((query, routed_answer))
+        return routed_answer, chat_history
 
     try:
+        # Per-session memory: recent turns verbatim, older ones in a rolling summary
+        try:
+            if "conversation_memory" not in ss:
+                ss.conversation_memory = ConversationMemory(
+                    summarizer=llm_summarizer(get_chat_model(configurations["openai_api_key"]))
+                )
+            memory = ss.conversation_memory.sync(chat_history)
+        except Exception as e:
+            # e.g. tiktoken or the summarizer model failed to load: plain recent turns instead
+            copilot_logger.error(f"Conversation memory failed, using plain history: {str(e)}")
+            memory = "".join(render_turn(human, ai) for human, ai in chat_history[-MEMORY_FALLBACK_TURNS:])
+
+        agent_executor = get_agent_executor(configurations)
+        metrics = TurnMetricsHandler()
+
         final_output = agent_executor.invoke(
                                                 {
                                                     "input": query,
                                                     "chat_history": memory
-                                                }
+                                                },
+                                                config={"callbacks": [metrics] + list(callbacks or [])}
                                             )
         
-        if final_output["output"] is not None:
-            chat_history.append((query, final_output["output"]))
+        output = final_output["output"]
+        stopped = output == _STOPPED_OUTPUT
+        if stopped:
+            output = partial_answer(final_output.get("intermediate_steps", []))
+
+        ss.last_turn_metrics = add_turn_timings(metrics.as_dict(stopped_early=stopped), callbacks)
+        copilot_logger.info(f"Chat turn metrics: {ss.last_turn_metrics}")
+
+        if output is not None:
+            chat_history.append((query, output))
 
         else:
             pass
 
-        return final_output["output"], chat_history
+        return output, chat_history
 
     except RateLimitError as e:
         copilot_logger.error("OpenAI RateLimitError")
@@ -71,5 +162,3 @@ def get_response(query, configurations, chat_history):
                             OpenAI plan and billing details."
         
         return None, None
-
-
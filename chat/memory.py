@@ -1,10 +1,138 @@
-def create_react_agent_memory(chat_history: list) -> str:
+import os
+import threading
+from collections import deque
+from functools import lru_cache
 
-    history = ""
+import logging
+copilot_logger = logging.getLogger("copilot")
 
-    for tuple in chat_history:
-        history += "Human: " + tuple[0]
-        history += "\nAI: " + tuple[1]
 
-    return history
+# Tokens of verbatim recent turns sent with every agent prompt
+MEMORY_TOKEN_BUDGET = int(os.environ.get("MEMORY_TOKEN_BUDGET", 2000))
+
+# Cap on the rolling summary of older turns
+MEMORY_SUMMARY_TOKEN_BUDGET = int(os.environ.get("MEMORY_SUMMARY_TOKEN_BUDGET", 400))
+
+MEMORY_ENCODING_MODEL = "gpt-3.5-turbo"
+
+
+@lru_cache(maxsize=None)
+def _encoding():
+    import tiktoken
+    return tiktoken.encoding_for_model(MEMORY_ENCODING_MODEL)
+
+
+def count_tokens(text):
+    return len(_encoding().encode(text))
+
+
+def truncate_tokens(text, max_tokens):
+    """Keep the last max_tokens tokens of text."""
+    tokens = _encoding().encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return _encoding().decode(tokens[-max_tokens:])
+
+
+def render_turn(human, ai):
+    return f"Human: {human}\nAI: {ai}\n"
+
+
+def llm_summarizer(model):
+    """Summarizer that folds new lines into the running summary with a chat model."""
+    from langchain_core.output_parsers import StrOutputParser
+    from utils.prompts import summary_prompt
+
+    chain = summary_prompt | model | StrOutputParser()
+
+    def summarize(summary, new_lines):
+        return chain.invoke({"summary": summary or "(none)", "new_lines": new_lines})
+
+    return summarize
+
+
+def _outline_summary(summary, turns):
+    # Used when no summarizer is configured or it fails: remember what was asked
+    asked = "\n".join(f"- User asked: {human[:200]}" for human, _ in turns)
+    return f"{summary}\n{asked}".strip()
+
+
+class ConversationMemory:
+    """
+    Token-budgeted chat history for the ReAct agent.
+    The most recent turns are kept verbatim within token_budget; older turns
+    are folded into a rolling summary capped at summary_budget. The rendered
+    history is cached, so adding a turn only touches the turns it evicts.
+    """
+
+    def __init__(self, summarizer=None, token_budget=MEMORY_TOKEN_BUDGET,
+                 summary_budget=MEMORY_SUMMARY_TOKEN_BUDGET):
+        self.summarizer = summarizer
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.summary = ""
+        self._turns = deque()  # (human, ai, rendered, tokens)
+        self._tokens = 0
+        self._turns_seen = 0
+        self._rendered = ""
+
+    def sync(self, chat_history):
+        """
+        Bring the memory up to date with a session's chat_history list of
+        (human, ai) tuples and return the rendered history. Only turns added
+        since the last call are processed; a shorter history (cleared chat,
+        retried turn) rebuilds the memory.
+        """
+        with self._lock:
+            if len(chat_history) < self._turns_seen:
+                self.reset()
+            new_turns = chat_history[self._turns_seen:]
+            if new_turns:
+                self._add_turns(new_turns)
+                self._turns_seen = len(chat_history)
+            return self._rendered
+
+    def _add_turns(self, turns):
+        for human, ai in turns:
+            rendered = render_turn(human, ai)
+            tokens = count_tokens(rendered)
+            self._turns.append((human, ai, rendered, tokens))
+            self._tokens += tokens
+
+        # The newest turn always stays, even when it alone is over budget
+        evicted = []
+        while self._tokens > self.token_budget and len(self._turns) > 1:
+            human, ai, rendered, tokens = self._turns.popleft()
+            self._tokens -= tokens
+            evicted.append((human, ai))
+
+        if evicted:
+            self._fold(evicted)
+
+        history = "".join(turn[2] for turn in self._turns)
+        if self.summary:
+            history = f"Summary of earlier conversation:\n{self.summary}\n\n{history}"
+        self._rendered = history
+
+    def _fold(self, turns):
+        # One summarizer call per sync, however many turns were evicted
+        new_lines = "".join(render_turn(human, ai) for human, ai in turns)
+        summary = None
+        if self.summarizer is not None:
+            try:
+                summary = self.summarizer(self.summary, new_lines)
+            except Exception as e:
+                copilot_logger.error(f"Conversation summary failed: {str(e)}")
+        if summary is None:
+            summary = _outline_summary(self.summary, turns)
+        self.summary = truncate_tokens(summary.strip(), self.summary_budget)
+
+    @property
+    def tokens(self):
+        """Approximate prompt tokens of the verbatim turns (the summary is capped separately)."""
+        return self._tokens
 
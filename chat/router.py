@@ -0,0 +1,122 @@
+import re
+import threading
+from collections import namedtuple
+
+import logging
+copilot_logger = logging.getLogger("copilot")
+
+from utils.tickers import get_ticker_resolver
+from utils.http import PooledQueryApi
+from utils.tools import get_current_stock_price, get_financial_data_from_sec_api
+from utils.memo import TOOL_ERROR_PREFIXES
+
+
+Intent = namedtuple("Intent", ["name", "ticker", "form_type"])
+
+_PRICE_RE = re.compile(
+    r"\b(?:stock|share)\s+price\b|\bprice\s+of\b|\bquote\s+for\b|\btrading\s+at\b|\bshares?\s+worth\b",
+    re.IGNORECASE
+)
+_LATEST_RE = re.compile(r"\b(?:latest|most\s+recent|last|newest|current)\b", re.IGNORECASE)
+_FORM_RE = re.compile(
+    r"\b(10-?k|10-?q|annual\s+report|quarterly\s+report|annual\s+filing|quarterly\s+filing)\b",
+    re.IGNORECASE
+)
+
+# Anything that asks for reasoning, comparison or history goes to the agent
+_OPEN_ENDED_RE = re.compile(
+    r"\b(?:why|should|compare|compared|versus|vs|trend|trends|pattern|patterns|analy[sz]e|analysis|"
+    r"explain|history|historical|over\s+the|past|forecast|predict|buy|sell|recommend|and)\b",
+    re.IGNORECASE
+)
+
+
+def classify_query(query):
+    """
+    Classify a chat message with local rules. Returns an Intent for simple
+    price or latest-filing lookups about one resolvable company, else None.
+    """
+    if _OPEN_ENDED_RE.search(query):
+        return None
+
+    wants_price = bool(_PRICE_RE.search(query))
+    form_match = _FORM_RE.search(query)
+    wants_filing = bool(form_match and _LATEST_RE.search(query))
+    if wants_price == wants_filing:
+        # Neither, or both at once: not a single tool call
+        return None
+
+    resolution = get_ticker_resolver().resolve(query)
+    if resolution is None:
+        return None
+
+    if wants_price:
+        return Intent("stock_price", resolution.ticker, None)
+
+    form = form_match.group(1).lower()
+    form_type = "10-Q" if ("q" in form or "quarter" in form) else "10-K"
+    return Intent("latest_filing", resolution.ticker, form_type)
+
+
+def format_filing_summary(summary):
+    return (
+        f"The latest {summary['form_type']} for {summary['company_name']} ({summary['ticker']}) "
+        f"was filed on {summary['filing_date']}, covering the period ending {summary['period_end']}.\n\n"
+        f"📄 Filing: {summary['filing_url']}"
+    )
+
+
+class IntentRouter:
+    """
+    Fast path in front of the ReAct agent: simple lookups are answered by
+    calling the tool directly, skipping the agent's LLM round trips.
+    """
+
+    def __init__(self):
+        self.routed = 0
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def route(self, query, configurations):
+        """Answer the query directly if it is a simple lookup; None means use the agent."""
+        answer = None
+        intent = classify_query(query)
+
+        try:
+            if intent is not None:
+                answer = self._dispatch(intent, configurations)
+        except Exception as e:
+            copilot_logger.error(f"Intent router failed for {intent.name}, using the agent: {str(e)}")
+            answer = None
+
+        with self._lock:
+            self.total += 1
+            if answer is not None:
+                self.routed += 1
+
+        copilot_logger.info(
+            f"Intent router: {intent.name if answer is not None else 'agent'} "
+            f"(hit rate {self.hit_rate():.0%} of {self.total})"
+        )
+        return answer
+
+    def _dispatch(self, intent, configurations):
+        if intent.name == "stock_price":
+            # The price tool reports failures as text; the agent gets those queries
+            answer = get_current_stock_price.run(intent.ticker)
+            return None if answer.startswith(TOOL_ERROR_PREFIXES) else answer
+
+        queryApi = PooledQueryApi(api_key=configurations["sec_api_key"])
+        summary = get_financial_data_from_sec_api(queryApi, intent.ticker, intent.form_type)
+        return format_filing_summary(summary) if summary else None
+
+    def hit_rate(self):
+        """Share of messages answered without the agent (each one saves at least two LLM calls)."""
+        return self.routed / self.total if self.total else 0.0
+
+    def stats(self):
+        with self._lock:
+            return {"routed": self.routed, "total": self.total, "hit_rate": self.hit_rate()}
+
+
+intent_router = IntentRouter()
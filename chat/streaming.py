@@ -0,0 +1,126 @@
+import time
+
+import logging
+copilot_logger = logging.getLogger("copilot")
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+FINAL_ANSWER_MARKER = "Final Answer:"
+
+
+class StreamlitAgentHandler(BaseCallbackHandler):
+    """
+    Streams a ReAct agent run into Streamlit as it happens: each tool call is
+    written to steps_container when the agent picks it, and the tokens after
+    "Final Answer:" are rendered into answer_placeholder as they arrive.
+
+    Records time_to_first_token (first token of any LLM call) and
+    time_to_first_answer_token, in seconds from the start of the run; see
+    as_dict and add_turn_timings.
+    """
+
+    def __init__(self, steps_container, answer_placeholder):
+        self.steps_container = steps_container
+        self.answer_placeholder = answer_placeholder
+        self.started = time.perf_counter()
+        self.time_to_first_token = None
+        self.time_to_first_answer_token = None
+        self.answer = ""
+        self._generation = ""
+        self._in_answer = False
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self._generation = ""
+        self._in_answer = False
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.on_llm_start(serialized, messages, **kwargs)
+
+    def on_llm_new_token(self, token, **kwargs):
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.perf_counter() - self.started
+
+        if self._in_answer:
+            self._emit(token)
+            return
+
+        self._generation += token
+        marker = self._generation.find(FINAL_ANSWER_MARKER)
+        if marker != -1:
+            self._in_answer = True
+            self.answer = ""
+            self._emit(self._generation[marker + len(FINAL_ANSWER_MARKER):].lstrip())
+
+    def _emit(self, text):
+        if not text:
+            return
+        if self.time_to_first_answer_token is None:
+            self.time_to_first_answer_token = time.perf_counter() - self.started
+        self.answer += text
+        self.answer_placeholder.markdown(self.answer + "▌")
+
+    def on_agent_action(self, action, **kwargs):
+        self.steps_container.markdown(f"🔧 **{action.tool}** — `{action.tool_input}`")
+
+    def on_tool_end(self, output, **kwargs):
+        observation = str(output)
+        if len(observation) > 300:
+            observation = observation[:300] + "…"
+        self.steps_container.caption(observation)
+
+    def on_agent_finish(self, finish, **kwargs):
+        self.answer_placeholder.markdown(self.answer or finish.return_values.get("output", ""))
+        copilot_logger.debug(
+            f"Chat turn: first token {self._format(self.time_to_first_token)}, "
+            f"first answer token {self._format(self.time_to_first_answer_token)}, "
+            f"total {time.perf_counter() - self.started:.2f}s"
+        )
+
+    def as_dict(self):
+        return {
+            "time_to_first_token": self._round(self.time_to_first_token),
+            "time_to_first_answer_token": self._round(self.time_to_first_answer_token),
+        }
+
+    @staticmethod
+    def _round(seconds):
+        return None if seconds is None else round(seconds, 2)
+
+    @staticmethod
+    def _format(seconds):
+        return "n/a" if seconds is None else f"{seconds:.2f}s"
+
+
+def add_turn_timings(metrics, callbacks):
+    """Add the first-token timings of any StreamlitAgentHandler in callbacks to a turn's metrics."""
+    for callback in callbacks or []:
+        if isinstance(callback, StreamlitAgentHandler):
+            metrics.update(callback.as_dict())
+    return metrics
+
+
+class TurnMetricsHandler(BaseCallbackHandler):
+    """Counts the LLM and tool calls made during one agent turn."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.llm_calls = 0
+        self.tool_calls = 0
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.llm_calls += 1
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.llm_calls += 1
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self.tool_calls += 1
+
+    def as_dict(self, stopped_early=False):
+        return {
+            "llm_calls": self.llm_calls,
+            "tool_calls": self.tool_calls,
+            "seconds": round(time.perf_counter() - self.started, 2),
+            "stopped_early": stopped_early,
+        }
@@ -7,10 +7,11 @@ from crewai import Agent
 
 from utils.tools import (
     retrieval_tool, search_tool, 
-    get_current_stock_price
+    get_current_stock_price, get_price_history_analysis, get_configurations
 )
 
-from langchain_openai import ChatOpenAI
+from utils.llm import get_chat_model
+from utils.memo import new_tool_memo, memoize_tool
 
 # from dotenv import load_dotenv
 # load_dotenv()
@@ -21,14 +22,19 @@ from langchain_openai import ChatOpenAI
 ss = st.session_state
 
 def get_openai_model():
-    """Get initialized OpenAI model with API key from session state."""
-    return ChatOpenAI(
-        model="gpt-3.5-turbo-16k", 
-        openai_api_key=ss.configurations["openai_api_key"]
-    )
+    """Get the shared OpenAI model for the API key in session state."""
+    return get_chat_model(get_configurations()["openai_api_key"])
 
 class InvestmentAgents():
 
+    def __init__(self, tool_memo=None):
+        # One memo per crew run: repeated tool calls across agents are free
+        self.tool_memo = tool_memo if tool_memo is not None else new_tool_memo()
+        self.retrieval_tool = memoize_tool(retrieval_tool, self.tool_memo)
+        self.search_tool = memoize_tool(search_tool, self.tool_memo)
+        self.get_current_stock_price = memoize_tool(get_current_stock_price, self.tool_memo)
+        self.get_price_history_analysis = memoize_tool(get_price_history_analysis, self.tool_memo)
+
     def fillings_researcher(self):
         return Agent(
             role="SEC Fillings Research Expert",
@@ -37,7 +43,7 @@ class InvestmentAgents():
             You excel at extracting specific financial data, numbers, and insights from 10-K and 10-Q forms.
             You always provide concrete financial figures, revenue numbers, expense breakdowns, and spending patterns.
             You never just say you found information - you always share the actual data and numbers.""",
-            tools=[retrieval_tool],
+            tools=[self.retrieval_tool],
             llm=get_openai_model(),
             allow_delegation=False,
             # verbose=True
@@ -48,7 +54,7 @@ class InvestmentAgents():
             role="Stock Price Seeker",
             goal="Find the current stock price of a company.",
             backstory="An expert stock market trader able to find out the current stock price of a company.",
-            tools=[get_current_stock_price],
+            tools=[self.get_current_stock_price, self.get_price_history_analysis],
             llm=get_openai_model(),
             allow_delegation=False,
             # verbose=True
@@ -60,7 +66,7 @@ class InvestmentAgents():
             goal="Find most recent news headlines that can affect investment decisions.",
             backstory="""An expert news analyst. Your expertise lies in getting relevant 
             news articles from the internet on a specific company.""",
-            tools=[search_tool],
+            tools=[self.search_tool],
             llm=get_openai_model(),
             # verbose=True
         )
@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+
+import logging
+copilot_logger = logging.getLogger("copilot")
+
+from utils.rate_limit import SEC_MAX_REQUESTS_PER_SECOND, UPSTREAM_LIMITS
+from utils.llm import LLM_MAX_CONCURRENCY_PER_KEY
+
+
+CREW_BATCH_WORKERS = int(os.environ.get("CREW_BATCH_WORKERS", 4))
+
+
+def read_companies(path):
+    with open(path) as f:
+        companies = [line.split("#", 1)[0].strip() for line in f]
+    return [company for company in companies if company]
+
+
+def _init_worker(workers):
+    # Each process has its own token bucket, upstream limiters and LLM
+    # semaphores, so the global budgets are split evenly between the workers.
+    # The filing and answer caches are on disk and shared by every worker.
+    from utils.rate_limit import sec_rate_limiter, get_upstream_limiter
+    from utils.llm import get_llm_registry
+
+    sec_rate_limiter.set_rate(SEC_MAX_REQUESTS_PER_SECOND / workers)
+    get_llm_registry().max_concurrency_per_key = max(LLM_MAX_CONCURRENCY_PER_KEY // workers, 1)
+
+    # Yahoo Finance and DuckDuckGo calls; each worker keeps at least one slot
+    for name in ("yahoo", "duckduckgo"):
+        initial, max_limit = UPSTREAM_LIMITS[name]
+        limiter = get_upstream_limiter(name)
+        limiter.max_limit = max(max_limit // workers, limiter.min_limit)
+        limiter.limit = float(max(initial // workers, limiter.min_limit))
+
+
+def _failed_record(company, error):
+    return {
+        "company": company,
+        "report": None,
+        "error": error,
+        "seconds": 0.0,
+        "timings": {},
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def run_company(company):
+    """Run one crew report in a worker process and return a result record."""
+    from crew.main import CopilotCrew
+
+    crew = CopilotCrew(company)
+    started = time.perf_counter()
+    try:
+        report = crew.run()
+        error = None
+    except Exception as e:
+        report = None
+        error = str(e)
+
+    return {
+        "company": company,
+        "report": None if report is None else str(report),
+        "error": error,
+        "seconds": time.perf_counter() - started,
+        "timings": crew.timings,
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+class JsonlWriter:
+    def __init__(self, path):
+        self._file = open(path, "a")
+
+    def write(self, record):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """Writes each record as its own row group, so finished companies survive a crash."""
+
+    def __init__(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._schema = pa.schema([
+            ("company", pa.string()),
+            ("report", pa.string()),
+            ("error", pa.string()),
+            ("seconds", pa.float64()),
+            ("timings", pa.string()),
+            ("finished_at", pa.string()),
+        ])
+        self._writer = pq.ParquetWriter(path, self._schema, compression="zstd")
+
+    def write(self, record):
+        import pyarrow as pa
+
+        row = dict(record, timings=json.dumps(record["timings"]))
+        self._writer.write_table(pa.Table.from_pylist([row], schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def open_writer(path):
+    return ParquetWriter(path) if path.endswith(".parquet") else JsonlWriter(path)
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(int(p * len(values)), len(values) - 1)]
+
+
+def summarize(records, elapsed):
+    """Throughput and per-stage latency for a finished batch."""
+    stages = {}
+    for record in records:
+        for stage, seconds in record["timings"].items():
+            stages.setdefault(stage, []).append(seconds)
+
+    return {
+        "companies": len(records),
+        "failed": sum(1 for record in records if record["error"]),
+        "elapsed_seconds": elapsed,
+        "companies_per_minute": len(records) / elapsed * 60 if elapsed else 0.0,
+        "stages": {
+            stage: {
+                "mean": sum(values) / len(values),
+                "p50": _percentile(values, 0.50),
+                "p95": _percentile(values, 0.95),
+            }
+            for stage, values in stages.items()
+        },
+    }
+
+
+def _run_pool(companies, workers, context, on_record):
+    """Run companies in one process pool; returns the companies lost when a worker crashed."""
+    broken = []
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(workers,)
+    ) as executor:
+        futures = {executor.submit(run_company, company): company for company in companies}
+        for future in as_completed(futures):
+            company = futures[future]
+            try:
+                on_record(future.result())
+            except BrokenProcessPool:
+                broken.append(company)
+            except Exception as e:
+                copilot_logger.error(f"Crew worker failed for {company}: {str(e)}")
+                on_record(_failed_record(company, f"worker failed: {e!r}"))
+    return broken
+
+
+def run_batch(companies, output, workers=CREW_BATCH_WORKERS):
+    """
+    Run crew reports for companies across worker processes, writing results
+    to output. A crashed worker breaks its whole pool, so the companies lost
+    with it are run again in a new pool; any lost a second time are run one
+    per process, and the one that crashes its own process is recorded as failed.
+    """
+    writer = open_writer(output)
+    records = []
+    started = time.perf_counter()
+
+    def on_record(record):
+        writer.write(record)
+        records.append(record)
+        status = "failed" if record["error"] else f"done in {record['seconds']:.0f}s"
+        print(f"[{len(records)}/{len(companies)}] {record['company']}: {status}", flush=True)
+
+    # spawn: workers must not inherit the parent's threads or open connections
+    context = multiprocessing.get_context("spawn")
+    try:
+        remaining = _run_pool(companies, workers, context, on_record)
+        if remaining:
+            copilot_logger.error(f"Crew worker crashed, running {len(remaining)} companies again")
+            remaining = _run_pool(remaining, workers, context, on_record)
+        for company in remaining:
+            if _run_pool([company], 1, context, on_record):
+                copilot_logger.error(f"Crew worker crashed running {company}")
+                on_record(_failed_record(company, "worker crashed"))
+    finally:
+        writer.close()
+
+    return summarize(records, time.perf_counter() - started)
+
+
+def print_summary(summary):
+    print(
+        f"\n{summary['companies']} companies ({summary['failed']} failed) in "
+        f"{summary['elapsed_seconds'] / 60:.1f} min: "
+        f"{summary['companies_per_minute']:.2f} companies/min"
+    )
+    for stage, latency in summary["stages"].items():
+        print(
+            f"  {stage:<20} mean {latency['mean']:6.1f}s  "
+            f"p50 {latency['p50']:6.1f}s  p95 {latency['p95']:6.1f}s"
+        )
+
+
+if __name__ == "__main__":
+    # Usage: python -m crew.batch <tickers.txt> [--output reports.jsonl|reports.parquet] [--workers N]
+    # One ticker or company name per line; API keys come from OPENAI_API_KEY and SEC_API_KEY.
+    parser = argparse.ArgumentParser(description="Run SEC-Copilot crew reports for a list of companies.")
+    parser.add_argument("companies", help="file with one ticker or company name per line")
+    parser.add_argument("--output", default="reports.jsonl", help=".jsonl or .parquet output file")
+    parser.add_argument("--workers", type=int, default=CREW_BATCH_WORKERS)
+    args = parser.parse_args()
+
+    if not (os.environ.get("OPENAI_API_KEY") and os.environ.get("SEC_API_KEY")):
+        print("Set OPENAI_API_KEY and SEC_API_KEY before running a batch.")
+        sys.exit(1)
+
+    companies = read_companies(args.companies)
+    print_summary(run_batch(companies, args.output, args.workers))
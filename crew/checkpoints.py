@@ -0,0 +1,101 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+import logging
+copilot_logger = logging.getLogger("copilot")
+
+from utils.cache import CACHE_DIR
+
+
+# Completed crew stages are reused for this long; stock prices go stale sooner
+CREW_CHECKPOINT_MAX_AGE_SECONDS = int(os.environ.get("CREW_CHECKPOINT_MAX_AGE_SECONDS", 6 * 3600))
+CREW_PRICE_CHECKPOINT_MAX_AGE_SECONDS = int(os.environ.get("CREW_PRICE_CHECKPOINT_MAX_AGE_SECONDS", 15 * 60))
+
+STAGE_MAX_AGE_SECONDS = {
+    "market_trade": CREW_PRICE_CHECKPOINT_MAX_AGE_SECONDS,
+}
+
+
+def date_window():
+    """Research is about 'now'; checkpoints never carry over to another UTC day."""
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def task_prompt_version(task):
+    """Hash of everything that shapes a task's prompt: its description and its agent's persona."""
+    agent = task.agent
+    prompt = "\x1e".join([task.description, agent.role, agent.goal, agent.backstory])
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+
+
+def checkpoint_key(company, stage, task, context=None):
+    """
+    Key for a stage output: (company, stage, date window, prompt version),
+    plus a hash of the context for stages that build on earlier outputs.
+    """
+    context_hash = hashlib.sha256((context or "").encode("utf-8")).hexdigest()[:16]
+    return "|".join([
+        " ".join(company.lower().split()), stage, date_window(), task_prompt_version(task), context_hash
+    ])
+
+
+class CheckpointStore:
+    """Completed crew task outputs in SQLite, so reruns resume from the first incomplete stage."""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CACHE_DIR, "crew_checkpoints.sqlite3")
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS checkpoints (
+                key TEXT PRIMARY KEY,
+                company TEXT,
+                stage TEXT,
+                output TEXT,
+                created_at REAL
+            )"""
+        )
+        self._conn.commit()
+
+    def get(self, key, max_age):
+        """Return a checkpointed output no older than max_age seconds, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT output, created_at FROM checkpoints WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or time.time() - row[1] > max_age:
+            return None
+        return row[0]
+
+    def put(self, key, company, stage, output):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?)",
+                (key, company, stage, output, time.time())
+            )
+            # Nothing from an earlier day can match a key again
+            self._conn.execute(
+                "DELETE FROM checkpoints WHERE created_at < ?",
+                (time.time() - 2 * 24 * 3600,)
+            )
+            self._conn.commit()
+
+
+_checkpoint_store = None
+_checkpoint_store_lock = threading.Lock()
+
+
+def get_checkpoint_store():
+    """Return the process-wide CheckpointStore, creating it on first use."""
+    global _checkpoint_store
+    if _checkpoint_store is None:
+        with _checkpoint_store_lock:
+            if _checkpoint_store is None:
+                _checkpoint_store = CheckpointStore()
+    return _checkpoint_store
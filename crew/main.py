@@ -1,14 +1,45 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from crewai import Crew
+from crewai.utilities import I18N
 
 from crew.agents import InvestmentAgents
 from crew.tasks import InvestmentTasks
+from crew.checkpoints import (
+    get_checkpoint_store, checkpoint_key, STAGE_MAX_AGE_SECONDS, CREW_CHECKPOINT_MAX_AGE_SECONDS
+)
+
+import logging
+copilot_logger = logging.getLogger("copilot")
 
 # from dotenv import load_dotenv
 # load_dotenv()
 
+# "parallel" runs the three research tasks concurrently and only the report
+# writer waits on them; "sequential" is crewAI's one-after-another process
+CREW_PROCESS = os.environ.get("CREW_PROCESS", "parallel")
+
+
+def _script_run_ctx():
+    # Tools read st.session_state, which is only reachable from threads that
+    # carry the Streamlit script context. None when running outside Streamlit.
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        return get_script_run_ctx()
+    except ImportError:
+        return None
+
+
 class CopilotCrew:
-    def __init__(self, company):
+    def __init__(self, company, process=CREW_PROCESS):
         self.company = company
+        self.process = process
+        # Seconds spent per stage in the last run, plus "total"
+        self.timings = {}
+        # Stages of the last run served from a checkpoint
+        self.resumed = []
 
     def run(self):
         agents = InvestmentAgents()
@@ -40,10 +71,104 @@ class CopilotCrew:
             verbose=True
         )
 
-        result = crew.kickoff()
+        self.timings = {}
+        self.resumed = []
+        started = time.perf_counter()
+
+        # Crew.kickoff() normally does this before running any task
+        for agent in crew.agents:
+            agent.i18n = I18N(language=crew.language)
+
+        research_tasks = {
+            "fillings_research": fillings_research,
+            "market_trade": market_trade,
+            "news_research": news_research,
+        }
+
+        if self.process == "parallel":
+            result = self._run_parallel(crew, research_tasks, report_writing)
+        else:
+            result = self._run_sequential(crew, dict(research_tasks, report_writing=report_writing))
+
+        self.timings["total"] = time.perf_counter() - started
+        copilot_logger.info(
+            f"Crew report for {self.company} ({self.process}): "
+            + ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in self.timings.items())
+            + f"; tool memo {agents.tool_memo.stats()}"
+            + (f"; resumed {', '.join(self.resumed)}" if self.resumed else "")
+        )
 
         return result
-    
+
+    def _execute(self, stage, task, context=None, checkpoint=True):
+        """
+        Run one task, or reuse its checkpointed output when the same stage ran
+        recently with the same prompt and context. Completed outputs are
+        checkpointed unless checkpoint is False (the context came from a failed
+        stage), so a failed run resumes from the first incomplete stage.
+        """
+        store = get_checkpoint_store()
+        key = checkpoint_key(self.company, stage, task, context)
+        max_age = STAGE_MAX_AGE_SECONDS.get(stage, CREW_CHECKPOINT_MAX_AGE_SECONDS)
+
+        stage_started = time.perf_counter()
+        output = store.get(key, max_age)
+        if output is not None:
+            self.resumed.append(stage)
+        else:
+            output = task.execute(context)
+            if checkpoint:
+                store.put(key, self.company, stage, output)
+        self.timings[stage] = time.perf_counter() - stage_started
+
+        return output
+
+    def _run_sequential(self, crew, tasks):
+        """crewAI's sequential process: each task gets the previous task's output as context."""
+        output = None
+        for stage, task in tasks.items():
+            crew._prepare_and_execute_task(task)
+            output = self._execute(stage, task, output)
+        return output
+
+    def _run_parallel(self, crew, research_tasks, report_task):
+        """
+        Run the independent research tasks concurrently, then hand all of
+        their outputs to the report writer once every one has finished.
+        """
+        ctx = _script_run_ctx()
+        failed = []
+
+        def run_stage(stage, task):
+            if ctx is not None:
+                from streamlit.runtime.scriptrunner import add_script_run_ctx
+                add_script_run_ctx(ctx=ctx)
+
+            # Research tasks run without delegation tools: delegating to an
+            # agent that is busy with its own task would share its executor
+            try:
+                return self._execute(stage, task)
+            except Exception as e:
+                copilot_logger.error(f"Crew stage {stage} failed: {str(e)}")
+                failed.append(stage)
+                return f"No findings available: {str(e)}"
+
+        with ThreadPoolExecutor(max_workers=len(research_tasks), thread_name_prefix="crew-stage") as executor:
+            futures = {
+                stage: executor.submit(run_stage, stage, task)
+                for stage, task in research_tasks.items()
+            }
+            # Synthesis barrier: the writer needs every research output
+            findings = {stage: future.result() for stage, future in futures.items()}
+
+        context = "\n\n".join(
+            f"{research_tasks[stage].agent.role}:\n{output}" for stage, output in findings.items()
+        )
+
+        crew._prepare_and_execute_task(report_task)
+        # A report written without some findings must not be served on resume
+        return self._execute("report_writing", report_task, context, checkpoint=not failed)
+
 if __name__ == "__main__":
     print("### Welcome to SEC-Copilot Crew")
     print("-------------------------------")
@@ -55,4 +180,3 @@ if __name__ == "__main__":
     print("Your Report: \n\n")
     print(result)
 
-
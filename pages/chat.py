@@ -2,6 +2,8 @@ import streamlit as st
 
 from streamlit.errors import StreamlitAPIException
 from chat.main import get_response
+from chat.router import intent_router
+from chat.streaming import StreamlitAgentHandler
 from app import login
 
 
@@ -75,28 +77,36 @@ else:
 
     if ss.messages[-1]["role"] != "co-pilot":
         with st.chat_message("Co-pilot"):
-            with st.spinner("Thinking..."):
-                answer, chat_history = get_response(query, ss.configurations, ss.chat_history)
-
-                if "error_message" in ss:
-                    st.error(ss.error_message)
-
-                    if st.button("Retry"):
-                        del ss["error_message"]
-                        ss.chat_history = ss.chat_history[:-1]
-                        query = ss.messages[-1]["message"]
-                        answer, chat_history = get_response(query, ss.configurations, ss.chat_history)
-
-                if answer is not None:
-                    placeholder = st.empty()
-                    full_answer = ''
-                    for item in answer:
-                        full_answer += item
-                        placeholder.markdown(full_answer)
-                    placeholder.markdown(full_answer)
-
-                    ss.chat_history = chat_history
-                    ss.messages.append({"role": "co-pilot", "message": full_answer})
+            steps = st.status("Thinking...")
+            placeholder = st.empty()
+            handler = StreamlitAgentHandler(steps, placeholder)
+            answer, chat_history = get_response(query, ss.configurations, ss.chat_history, callbacks=[handler])
+
+            if "error_message" in ss:
+                steps.update(label="Something went wrong", state="error")
+                st.error(ss.error_message)
+
+                if st.button("Retry"):
+                    del ss["error_message"]
+                    ss.chat_history = ss.chat_history[:-1]
+                    query = ss.messages[-1]["message"]
+                    handler = StreamlitAgentHandler(steps, placeholder)
+                    answer, chat_history = get_response(query, ss.configurations, ss.chat_history, callbacks=[handler])
+
+            if answer is not None:
+                steps.update(label="Done", state="complete", expanded=False)
+                # The streamed text is already on screen; this renders the
+                # final output exactly as the agent returned it
+                placeholder.markdown(answer)
+
+                ss.chat_history = chat_history
+                ss.messages.append({"role": "co-pilot", "message": answer})
+
+    if "last_turn_metrics" in ss:
+        with st.sidebar.expander("⏱️ Last turn"):
+            st.json(ss.last_turn_metrics)
+            st.caption("Intent router (answered without the agent)")
+            st.json(intent_router.stats())
 
 with st.sidebar:
     with st.sidebar.expander("📬 Contact"):
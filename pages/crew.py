@@ -38,6 +38,16 @@ else:
 
             st.markdown(result)
 
+            if crew.timings:
+                st.caption(
+                    "Research timings: "
+                    + ", ".join(f"{stage.replace('_', ' ')} {seconds:.1f}s" for stage, seconds in crew.timings.items())
+                )
+            if crew.resumed:
+                st.caption(
+                    "Reused recent results for: " + ", ".join(stage.replace('_', ' ') for stage in crew.resumed)
+                )
+
 with st.sidebar:
     with st.sidebar.expander("📬 Contact"):
 
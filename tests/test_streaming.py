@@ -0,0 +1,36 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from chat.streaming import StreamlitAgentHandler, add_turn_timings
+
+
+class _Placeholder:
+    def markdown(self, text):
+        self.text = text
+
+
+class _Finish:
+    return_values = {"output": "42"}
+
+
+def test_turn_timings_are_kept_after_the_turn():
+    handler = StreamlitAgentHandler(_Placeholder(), _Placeholder())
+    handler.on_llm_start({}, ["prompt"])
+    handler.on_llm_new_token("Thought: done\n")
+    handler.on_llm_new_token("Final Answer: 42")
+    handler.on_agent_finish(_Finish())
+
+    metrics = add_turn_timings({"llm_calls": 1}, [object(), handler])
+
+    assert metrics["llm_calls"] == 1
+    assert metrics["time_to_first_token"] is not None
+    assert metrics["time_to_first_answer_token"] >= metrics["time_to_first_token"]
+
+
+def test_turn_without_tokens_has_no_timings():
+    handler = StreamlitAgentHandler(_Placeholder(), _Placeholder())
+
+    metrics = add_turn_timings({}, [handler])
+
+    assert metrics == {"time_to_first_token": None, "time_to_first_answer_token": None}
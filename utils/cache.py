@@ -0,0 +1,496 @@
+import os
+import re
+import json
+import hashlib
+import time
+import zlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import logging
+copilot_logger = logging.getLogger("copilot")
+
+
+CACHE_DIR = os.environ.get("SEC_COPILOT_CACHE_DIR", ".cache")
+
+# Filings never change once filed, so entries are only revalidated against
+# EDGAR (ETag / Last-Modified) after they have been on disk this long.
+FILING_CACHE_MAX_BYTES = int(os.environ.get("FILING_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+FILING_CACHE_REVALIDATE_SECONDS = int(os.environ.get("FILING_CACHE_REVALIDATE_SECONDS", 7 * 24 * 3600))
+
+# Assembled retriever context per normalized question
+RETRIEVER_CONTEXT_TTL_SECONDS = int(os.environ.get("RETRIEVER_CONTEXT_TTL_SECONDS", 1800))
+
+# Filing metadata only changes when a company files, which for 10-K/10-Q is
+# a few times a year, so search results are reused for a few hours.
+METADATA_CACHE_TTL_SECONDS = int(os.environ.get("METADATA_CACHE_TTL_SECONDS", 6 * 3600))
+METADATA_CACHE_MAX_ENTRIES = 2048
+
+# Synthesized retriever answers. Keys include a hash of the filing context,
+# so new filing data never hits an old answer; the TTL only bounds staleness
+# of the wording itself.
+ANSWER_CACHE_TTL_SECONDS = int(os.environ.get("ANSWER_CACHE_TTL_SECONDS", 24 * 3600))
+ANSWER_CACHE_MAX_BYTES = int(os.environ.get("ANSWER_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+_EDGAR_ARCHIVE_RE = re.compile(
+    r"/Archives/edgar/data/\d+/(\d{10}-?\d{2}-?\d{6}|\d{18})/([^?#]+)", re.IGNORECASE
+)
+
+
+def filing_cache_key(filing_url):
+    """
+    Normalize a filing URL into a cache key.
+    EDGAR archive URLs are keyed by accession number and document name, so the
+    same document is shared regardless of host, scheme or CIK formatting.
+    """
+    match = _EDGAR_ARCHIVE_RE.search(filing_url)
+    if match:
+        accession = match.group(1).replace("-", "")
+        return f"{accession}/{match.group(2).lower()}"
+    return filing_url.strip()
+
+
+def _normalize_query_value(value):
+    if isinstance(value, dict):
+        return {str(k): _normalize_query_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize_query_value(v) for v in value]
+    if isinstance(value, str):
+        return " ".join(value.split())
+    # sec-api accepts "from": 0 and "from": "0" alike
+    return str(value)
+
+
+def query_cache_key(query):
+    """
+    Normalize a search query dict into a cache key: key order, whitespace and
+    number-vs-string spellings of the same value do not produce different keys.
+    """
+    return json.dumps(_normalize_query_value(query), sort_keys=True, separators=(",", ":"))
+
+
+def normalize_question(question):
+    """Case, whitespace and trailing punctuation do not change what is being asked."""
+    return " ".join(question.lower().split()).rstrip("?.! ")
+
+
+def answer_cache_key(question, context, model, prompt_version):
+    """
+    Key for a synthesized answer: the normalized question, a hash of every
+    context block, the model name and the prompt version.
+    """
+    context_hash = hashlib.sha256()
+    for block in context:
+        context_hash.update(block.encode("utf-8"))
+        context_hash.update(b"\x1e")
+
+    key = json.dumps(
+        [normalize_question(question), context_hash.hexdigest(), model, prompt_version],
+        separators=(",", ":")
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class CachedFiling:
+    """A raw filing document read back from the cache, decompressed on demand."""
+
+    def __init__(self, compressed, etag, last_modified, fetched_at):
+        self.compressed = compressed
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+
+    @property
+    def content(self):
+        return zlib.decompress(self.compressed)
+
+    def iter_content(self, chunk_size=64 * 1024):
+        """Yield the document in pieces without decompressing it all at once."""
+        decompressor = zlib.decompressobj()
+        for start in range(0, len(self.compressed), chunk_size):
+            chunk = decompressor.decompress(self.compressed[start:start + chunk_size])
+            if chunk:
+                yield chunk
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+
+    def is_intact(self, chunk_size=64 * 1024):
+        """True if the document decompresses completely; checked in pieces, output discarded."""
+        decompressor = zlib.decompressobj()
+        try:
+            for start in range(0, len(self.compressed), chunk_size):
+                decompressor.decompress(self.compressed[start:start + chunk_size])
+        except zlib.error:
+            return False
+        return decompressor.eof
+
+    def is_stale(self, max_age=FILING_CACHE_REVALIDATE_SECONDS):
+        return time.time() - self.fetched_at > max_age
+
+
+class FilingWriter:
+    """Compresses a document into the cache as it streams in; nothing is stored until commit()."""
+
+    def __init__(self, cache, filing_url, etag=None, last_modified=None):
+        self._cache = cache
+        self._filing_url = filing_url
+        self._etag = etag
+        self._last_modified = last_modified
+        self._compressor = zlib.compressobj(6)
+        self._parts = []
+
+    def write(self, chunk):
+        self._parts.append(self._compressor.compress(chunk))
+
+    def commit(self):
+        self._parts.append(self._compressor.flush())
+        self._cache._store(self._filing_url, b"".join(self._parts), self._etag, self._last_modified)
+
+
+class FilingCache:
+    """
+    Process-wide on-disk cache for raw filing documents.
+    Entries are zlib-compressed in a SQLite file and evicted least recently used
+    first once the total compressed size exceeds max_bytes.
+    """
+
+    def __init__(self, path=None, max_bytes=FILING_CACHE_MAX_BYTES):
+        self.path = path or os.path.join(CACHE_DIR, "filings.sqlite3")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS filings (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                content BLOB,
+                size INTEGER,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL,
+                last_access REAL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS filings_lru ON filings (last_access)")
+        self._conn.commit()
+
+    def get(self, filing_url):
+        """Return the CachedFiling for a URL, or None on a miss."""
+        key = filing_cache_key(filing_url)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, etag, last_modified, fetched_at FROM filings WHERE key = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE filings SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+
+        return CachedFiling(row[0], row[1], row[2], row[3])
+
+    def put(self, filing_url, content, etag=None, last_modified=None):
+        """Store (or replace) a raw document and evict old entries if over budget."""
+        self._store(filing_url, zlib.compress(content, 6), etag, last_modified)
+
+    def writer(self, filing_url, etag=None, last_modified=None):
+        """Return a FilingWriter for storing a document chunk by chunk."""
+        return FilingWriter(self, filing_url, etag, last_modified)
+
+    def _store(self, filing_url, compressed, etag, last_modified):
+        key = filing_cache_key(filing_url)
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO filings VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, filing_url, compressed, len(compressed), etag, last_modified, now, now)
+            )
+            self._conn.commit()
+            self._evict()
+
+    def touch(self, filing_url):
+        """Mark an entry as freshly revalidated (e.g. after a 304 Not Modified)."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE filings SET fetched_at = ?, last_access = ? WHERE key = ?",
+                (now, now, filing_cache_key(filing_url))
+            )
+            self._conn.commit()
+
+    def delete(self, filing_url):
+        with self._lock:
+            self._conn.execute("DELETE FROM filings WHERE key = ?", (filing_cache_key(filing_url),))
+            self._conn.commit()
+
+    def urls(self):
+        """Return the URLs of every cached document, most recently used first."""
+        with self._lock:
+            rows = self._conn.execute("SELECT url FROM filings ORDER BY last_access DESC").fetchall()
+        return [row[0] for row in rows]
+
+    def total_bytes(self):
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM filings").fetchone()[0]
+
+    def _evict(self):
+        # Caller holds self._lock.
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM filings").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self._conn.execute("SELECT key, size FROM filings ORDER BY last_access ASC").fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+
+        self._conn.executemany("DELETE FROM filings WHERE key = ?", evicted)
+        self._conn.commit()
+        copilot_logger.info(f"Evicted {len(evicted)} filings from the on-disk cache.")
+
+
+class _Flight:
+    """An upstream call in progress that other callers for the same key wait on."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """
+    Thread-safe in-memory cache whose entries expire after ttl seconds.
+    Loads are single-flight: when several callers miss on the same key at once,
+    one of them calls the loader and the others wait for its result (or error).
+    Failed loads are not cached.
+    """
+
+    def __init__(self, ttl, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get_or_load(self, key, loader):
+        """Return the cached value for key, calling loader() to fill it on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except BaseException as e:
+            flight.error = e
+            raise
+        else:
+            with self._lock:
+                self._entries[key] = (time.monotonic() + self.ttl, flight.value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+        return flight.value
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss (counted as one)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """Store (or refresh) a value, restarting its TTL."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def expires_in(self, key):
+        """Seconds until key expires; 0 if it is missing or already expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return max(entry[0] - time.monotonic(), 0) if entry is not None else 0
+
+    def invalidate(self, key=None):
+        """Drop one entry, or every entry when key is None."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        """Hit, miss and coalesced-wait counters; coalesced waits never reach upstream."""
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "entries": len(self._entries),
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
+
+
+class AnswerCache:
+    """
+    Process-wide on-disk cache of LLM answers, stored in SQLite. Entries expire
+    after ttl seconds and are evicted least recently used first once the
+    total size exceeds max_bytes.
+    """
+
+    def __init__(self, path=None, ttl=ANSWER_CACHE_TTL_SECONDS, max_bytes=ANSWER_CACHE_MAX_BYTES):
+        self.path = path or os.path.join(CACHE_DIR, "answers.sqlite3")
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS answers (
+                key TEXT PRIMARY KEY,
+                answer TEXT,
+                size INTEGER,
+                created_at REAL,
+                last_access REAL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_lru ON answers (last_access)")
+        self._conn.commit()
+
+    def get(self, key):
+        """Return the cached answer for a key, or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer, created_at FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE answers SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return row[0]
+
+    def put(self, key, answer):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers VALUES (?, ?, ?, ?, ?)",
+                (key, answer, len(answer.encode("utf-8")), now, now)
+            )
+            self._conn.commit()
+            self._evict()
+
+    def _evict(self):
+        # Caller holds self._lock.
+        self._conn.execute("DELETE FROM answers WHERE created_at < ?", (time.time() - self.ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM answers").fetchone()[0]
+        if total > self.max_bytes:
+            rows = self._conn.execute("SELECT key, size FROM answers ORDER BY last_access ASC").fetchall()
+            evicted = []
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                evicted.append((key,))
+                total -= size
+            self._conn.executemany("DELETE FROM answers WHERE key = ?", evicted)
+        self._conn.commit()
+
+
+_filing_cache = None
+_filing_cache_lock = threading.Lock()
+
+
+def get_filing_cache():
+    """Return the process-wide FilingCache, creating it on first use."""
+    global _filing_cache
+    if _filing_cache is None:
+        with _filing_cache_lock:
+            if _filing_cache is None:
+                _filing_cache = FilingCache()
+    return _filing_cache
+
+
+_metadata_cache = None
+
+
+def get_metadata_cache():
+    """Return the process-wide TTLCache for SEC filing metadata searches."""
+    global _metadata_cache
+    if _metadata_cache is None:
+        with _filing_cache_lock:
+            if _metadata_cache is None:
+                _metadata_cache = TTLCache(METADATA_CACHE_TTL_SECONDS, METADATA_CACHE_MAX_ENTRIES)
+    return _metadata_cache
+
+
+_answer_cache = None
+
+
+def get_answer_cache():
+    """Return the process-wide AnswerCache, creating it on first use."""
+    global _answer_cache
+    if _answer_cache is None:
+        with _filing_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = AnswerCache()
+    return _answer_cache
+
+
+_context_cache = None
+
+
+def get_context_cache():
+    """Return the process-wide TTLCache of assembled retriever contexts."""
+    global _context_cache
+    if _context_cache is None:
+        with _filing_cache_lock:
+            if _context_cache is None:
+                _context_cache = TTLCache(RETRIEVER_CONTEXT_TTL_SECONDS, METADATA_CACHE_MAX_ENTRIES)
+    return _context_cache
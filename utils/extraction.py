@@ -0,0 +1,583 @@
+import re
+import threading
+from collections import namedtuple, deque
+
+
+# Metric labels in priority order: for each metric the first label that
+# matches anywhere in the filing wins, and the largest amount found for it
+# is reported.
+METRIC_LABELS = {
+    'revenue_millions': ['Net sales', 'Total net sales', 'Revenue', 'Total revenue'],
+    'net_income_millions': ['Net income', 'Net earnings'],
+    'total_assets_millions': ['Total assets'],
+    'cash_millions': ['Cash and cash equivalents'],
+}
+
+AMOUNT_PATTERN = r'[\s\$]*(\d{1,3}(?:,\d{3})*)'
+
+MetricMatch = namedtuple("MetricMatch", ["metric", "label", "value", "offset", "end"])
+
+
+def _build_label_table(metric_labels):
+    """
+    Map every lower-cased label to the (metric, label) pairs it should be
+    credited to. A label also credits any shorter label that is its suffix
+    ("total net sales" is also a "net sales" match), mirroring what separate
+    per-label scans would have found.
+    """
+    labels = {}
+    for metric, metric_label_list in metric_labels.items():
+        for label in metric_label_list:
+            labels[label.lower()] = (metric, label)
+
+    table = {}
+    for key in labels:
+        table[key] = [labels[other] for other in labels if key.endswith(other)]
+    return table
+
+
+def _trie_regex(words):
+    """
+    Build a regex alternation factored as a character trie, so shared prefixes
+    ("net sales" / "net income") are matched once instead of once per label.
+    Longer labels are preferred over their prefixes.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        if len(branches) == 1 and '' not in node:
+            return branches[0]
+        group = '(?:' + '|'.join(branches) + ')'
+        return group + '?' if '' in node else group
+
+    return build(trie)
+
+
+_LABEL_TABLE = _build_label_table(METRIC_LABELS)
+
+# The pattern runs over lower-cased text: case-insensitive matching defeats
+# most of the regex engine's fast paths.
+_METRIC_PATTERN = re.compile(r'(' + _trie_regex(_LABEL_TABLE) + r')' + AMOUNT_PATTERN)
+_METRIC_PATTERN_IGNORECASE = re.compile(_METRIC_PATTERN.pattern, re.IGNORECASE)
+
+
+def find_metric_matches(text):
+    """Scan the text once and yield a MetricMatch for every labelled amount."""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        matches = _METRIC_PATTERN.finditer(lowered)
+    else:
+        # A few non-ASCII characters change length when lower-cased, which
+        # would shift the reported offsets
+        matches = _METRIC_PATTERN_IGNORECASE.finditer(text)
+
+    for match in matches:
+        value = int(match.group(2).replace(',', ''))
+        for metric, label in _LABEL_TABLE[match.group(1).lower()]:
+            yield MetricMatch(metric, label, value, match.start(), match.end())
+
+
+def _reduce_amounts(amounts):
+    # amounts maps label -> list of values seen for it
+    financial_data = {}
+    for metric, labels in METRIC_LABELS.items():
+        for label in labels:
+            if label in amounts:
+                financial_data[metric] = max(amounts[label])
+                break
+    return financial_data
+
+
+def extract_metrics(text):
+    """
+    Extract key financial metrics from the plain text of a filing in a single
+    pass. Returns the same dict as the original per-pattern scans, e.g.
+    {'revenue_millions': 394328, 'net_income_millions': 96995, ...}.
+    """
+    amounts = {}
+    for record in find_metric_matches(text):
+        amounts.setdefault(record.label, []).append(record.value)
+
+    return _reduce_amounts(amounts)
+
+
+_MAX_LABEL_LENGTH = max(len(label) for label in _LABEL_TABLE)
+
+
+def _is_amount_char(char):
+    # Same character classes as AMOUNT_PATTERN: \s, $, \d and ','
+    return char.isspace() or char.isdecimal() or char in '$,'
+
+
+# How much text MetricScanner buffers before scanning
+SCAN_CHUNK_SIZE = 64 * 1024
+
+
+class MetricScanner:
+    """
+    Incremental counterpart of extract_metrics for text that arrives in pieces.
+    Only a short tail of unscanned text is buffered, and the matches are exactly
+    those a single scan over the concatenated text would find.
+    """
+
+    def __init__(self):
+        self._tail = ""
+        self._pieces = []
+        self._pending = 0
+        self._amounts = {}
+        self.chars_scanned = 0
+
+    def feed(self, text):
+        self._pieces.append(text)
+        self._pending += len(text)
+        if self._pending >= SCAN_CHUNK_SIZE:
+            self._scan(final=False)
+
+    def close(self):
+        """Scan whatever is left and return the extracted metrics."""
+        self._scan(final=True)
+        return _reduce_amounts(self._amounts)
+
+    @staticmethod
+    def _safe_cut(buffer):
+        # A match still in progress at the end of the buffer can only start
+        # within one label length before the trailing run of amount characters.
+        cut = len(buffer)
+        while cut and _is_amount_char(buffer[cut - 1]):
+            cut -= 1
+        return max(cut - _MAX_LABEL_LENGTH, 0)
+
+    def _scan(self, final):
+        buffer = self._tail + "".join(self._pieces)
+        self._pieces = []
+        self._pending = 0
+
+        limit = len(buffer) if final else self._safe_cut(buffer)
+        resume = limit
+
+        for record in find_metric_matches(buffer):
+            if record.offset >= limit:
+                break
+            self._amounts.setdefault(record.label, []).append(record.value)
+            resume = max(resume, record.end)
+
+        self.chars_scanned += resume
+        self._tail = buffer[resume:]
+
+
+class _TextTarget:
+    """lxml parser target that streams text nodes into a MetricScanner without building a tree."""
+
+    # Text BeautifulSoup's get_text() leaves out
+    SKIPPED_TAGS = {"script", "style"}
+
+    def __init__(self, scanner):
+        self.scanner = scanner
+        self._skip_depth = 0
+
+    def start(self, tag, attrib):
+        if tag in self.SKIPPED_TAGS:
+            self._skip_depth += 1
+
+    def end(self, tag):
+        if tag in self.SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+
+    def data(self, data):
+        if not self._skip_depth:
+            self.scanner.feed(data)
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        return self.scanner.close()
+
+
+StreamingParseStats = namedtuple(
+    "StreamingParseStats", ["bytes_read", "chars_scanned", "seconds", "rss_growth_bytes"]
+)
+
+# Most recent streamed parses, summarized by streaming_parse_stats()
+STREAMING_STATS_WINDOW = 100
+_recent_parses = deque(maxlen=STREAMING_STATS_WINDOW)
+_recent_parses_lock = threading.Lock()
+
+
+def current_rss_bytes():
+    """Current resident set size of this process in bytes, or None if unavailable."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        pass
+
+    try:
+        import os
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def streaming_parse_stats():
+    """Throughput and memory growth over the last STREAMING_STATS_WINDOW streamed parses."""
+    with _recent_parses_lock:
+        parses = list(_recent_parses)
+    if not parses:
+        return {"parses": 0}
+
+    growth = [stats.rss_growth_bytes for stats in parses if stats.rss_growth_bytes is not None]
+    total_bytes = sum(stats.bytes_read for stats in parses)
+    total_seconds = sum(stats.seconds for stats in parses)
+    return {
+        "parses": len(parses),
+        "bytes_read": total_bytes,
+        "mb_per_second": total_bytes / 2**20 / max(total_seconds, 1e-9),
+        "max_rss_growth_bytes": max(growth) if growth else None,
+        "last": parses[-1]._asdict(),
+    }
+
+
+def stream_extract_metrics(chunks):
+    """
+    Extract the same metrics as extract_metrics from an iterable of raw HTML
+    byte chunks, e.g. a streaming HTTP download. lxml's incremental HTML parser
+    hands text to a MetricScanner as it arrives, so neither the document tree nor
+    the full text is ever held in memory. Returns (financial_data, stats).
+
+    stats.rss_growth_bytes is the largest rise in resident memory above its
+    level at the start of this parse, sampled after every chunk. Other work
+    in the process during the parse is included in it.
+    """
+    import time
+    from lxml import etree
+
+    started = time.perf_counter()
+    scanner = MetricScanner()
+    parser = etree.HTMLParser(target=_TextTarget(scanner))
+
+    rss_start = current_rss_bytes()
+    rss_peak = rss_start
+
+    bytes_read = 0
+    for chunk in chunks:
+        if chunk:
+            bytes_read += len(chunk)
+            parser.feed(chunk)
+            if rss_start is not None:
+                rss_peak = max(rss_peak, current_rss_bytes() or 0)
+
+    financial_data = parser.close() if bytes_read else scanner.close()
+
+    stats = StreamingParseStats(
+        bytes_read=bytes_read,
+        chars_scanned=scanner.chars_scanned,
+        seconds=time.perf_counter() - started,
+        rss_growth_bytes=rss_peak - rss_start if rss_start is not None else None,
+    )
+    with _recent_parses_lock:
+        _recent_parses.append(stats)
+    return financial_data, stats
+
+
+# Table-driven statement extraction. Each field lists its row labels in
+# priority order; labels are matched against the normalized first cell of a
+# row, exact matches before prefix matches.
+STATEMENT_ROWS = {
+    'income_statement': {
+        'revenue': ['TOTAL NET SALES', 'TOTAL NET REVENUES', 'TOTAL NET REVENUE', 'TOTAL REVENUES',
+                    'TOTAL REVENUE', 'NET SALES', 'NET REVENUES', 'NET REVENUE', 'REVENUES', 'REVENUE'],
+        'gross_profit': ['GROSS PROFIT', 'GROSS MARGIN', 'GROSS INCOME'],
+        'operating_expenses': ['TOTAL OPERATING EXPENSES', 'OPERATING EXPENSES'],
+        'operating_income': ['OPERATING INCOME', 'INCOME FROM OPERATIONS', 'OPERATING LOSS'],
+        'net_income': ['NET INCOME', 'NET EARNINGS', 'NET LOSS'],
+    },
+    'balance_sheet': {
+        'cash_and_equivalents': ['CASH AND CASH EQUIVALENTS', 'CASH AND EQUIVALENTS'],
+        'total_current_assets': ['TOTAL CURRENT ASSETS'],
+        'total_assets': ['TOTAL ASSETS'],
+        'total_current_liabilities': ['TOTAL CURRENT LIABILITIES'],
+        'total_liabilities': ['TOTAL LIABILITIES'],
+        'stockholders_equity': ['TOTAL STOCKHOLDERS EQUITY', 'TOTAL SHAREHOLDERS EQUITY',
+                                'STOCKHOLDERS EQUITY', 'SHAREHOLDERS EQUITY', 'TOTAL EQUITY'],
+    },
+    'cash_flow': {
+        'operating_cash_flow': ['NET CASH PROVIDED BY OPERATING', 'NET CASH PROVIDED BY USED IN OPERATING',
+                                'CASH GENERATED BY OPERATING', 'NET CASH FROM OPERATING', 'CASH FROM OPERATING'],
+        'investing_cash_flow': ['NET CASH USED IN INVESTING', 'NET CASH PROVIDED BY USED IN INVESTING',
+                                'CASH GENERATED BY USED IN INVESTING', 'CASH USED IN INVESTING',
+                                'NET CASH FROM INVESTING', 'CASH FROM INVESTING'],
+        'financing_cash_flow': ['NET CASH PROVIDED BY FINANCING', 'NET CASH USED IN FINANCING',
+                                'NET CASH PROVIDED BY USED IN FINANCING', 'CASH USED IN FINANCING',
+                                'NET CASH FROM FINANCING', 'CASH FROM FINANCING'],
+    },
+}
+
+# Rows that start like a field label but are something else
+# ("Net income per share", "Total liabilities and stockholders' equity")
+EXCLUDED_ROW_WORDS = {
+    'revenue': ['COST'],
+    'net_income': ['PER SHARE', 'PER DILUTED', 'PER BASIC', 'NONCONTROLLING'],
+    'total_liabilities': ['EQUITY'],
+    'stockholders_equity': ['LIABILITIES'],
+}
+
+SCALES = {'thousands': 1_000, 'millions': 1_000_000, 'billions': 1_000_000_000}
+
+_SCALE_RE = re.compile(r'in\s+(thousands|millions|billions)', re.IGNORECASE)
+_LABEL_CLEAN_RE = re.compile(r'[^A-Z0-9]+')
+_CELL_NUMBER_RE = re.compile(r'^\(?(\d+(?:\.\d+)?)\)?$')
+
+# A table needs at least this many recognized fields to be classified
+MIN_CLASSIFIED_FIELDS = 2
+
+
+def normalize_row_label(text):
+    """Upper-case a row label and collapse punctuation and whitespace to single spaces."""
+    return _LABEL_CLEAN_RE.sub(' ', text.upper()).strip()
+
+
+def _normalize_spec(statement_rows):
+    return {
+        statement: {
+            field: [normalize_row_label(keyword) for keyword in keywords]
+            for field, keywords in fields.items()
+        }
+        for statement, fields in statement_rows.items()
+    }
+
+
+_STATEMENT_SPEC = _normalize_spec(STATEMENT_ROWS)
+
+
+def parse_cell_value(text):
+    """Parse a financial table cell such as '$ 1,234', '(56.7)' or '(1,234'; None if not a number."""
+    text = text.strip()
+    number_match = _CELL_NUMBER_RE.match(re.sub(r'[,$\s]', '', text))
+    if not number_match:
+        return None
+    value = float(number_match.group(1))
+    # Negative numbers are shown in parentheses, often with ')' in the next cell
+    return -value if text.startswith('(') else value
+
+
+def detect_scale(text):
+    """Return the multiplier stated in text like '(In millions, except per share data)', or None."""
+    match = _SCALE_RE.search(text)
+    return SCALES[match.group(1).lower()] if match else None
+
+
+def _match_row(label, fields):
+    """Return {field: rank} for every field the row label matches; lower rank is better."""
+    matches = {}
+    for field, keywords in fields.items():
+        if any(word in label for word in EXCLUDED_ROW_WORDS.get(field, ())):
+            continue
+        for priority, keyword in enumerate(keywords):
+            if label == keyword:
+                matches[field] = (priority, 0)
+                break
+            if label.startswith(keyword):
+                matches[field] = (priority, 1)
+                break
+    return matches
+
+
+def match_statement_rows(rows):
+    """
+    Match every row of a table against every statement in one traversal.
+    rows is a list of rows, each a list of cell strings with the label first.
+    Returns {statement: {field: (rank, value_cells)}} keeping the best row per field.
+    """
+    candidates = {statement: {} for statement in _STATEMENT_SPEC}
+
+    for cells in rows:
+        if len(cells) < 2:
+            continue
+        label = normalize_row_label(cells[0])
+        if not label:
+            continue
+
+        for statement, fields in _STATEMENT_SPEC.items():
+            for field, rank in _match_row(label, fields).items():
+                best = candidates[statement].get(field)
+                if best is None or rank < best[0]:
+                    candidates[statement][field] = (rank, cells[1:])
+
+    return candidates
+
+
+def statement_values(matched_fields):
+    """Turn matched rows into {field: value}, taking the first number in each row (the most recent period)."""
+    values = {}
+    for field, (_, cells) in matched_fields.items():
+        for cell in cells:
+            value = parse_cell_value(cell)
+            if value is not None:
+                values[field] = value
+                break
+    return values
+
+
+def extract_table_statement(rows, context_text=""):
+    """
+    Classify a table as an income statement, balance sheet or cash flow
+    statement and extract its values. Returns (statement, {'scale', 'values'})
+    or (None, None) if the table is none of them. The scale is read from the
+    table header, falling back to context_text (the text preceding the table).
+    """
+    candidates = match_statement_rows(rows)
+
+    statement = max(candidates, key=lambda name: len(candidates[name]))
+    if len(candidates[statement]) < MIN_CLASSIFIED_FIELDS:
+        return None, None
+
+    values = statement_values(candidates[statement])
+    if len(values) < MIN_CLASSIFIED_FIELDS:
+        return None, None
+
+    header_text = " ".join(" ".join(cells) for cells in rows[:5])
+    scale = detect_scale(header_text) or detect_scale(context_text)
+
+    return statement, {'scale': scale, 'values': values}
+
+
+def merge_statements(statements, statement, extracted):
+    """Merge one table's extraction into the per-filing result; the first table found wins per field."""
+    if statement is None:
+        return
+    existing = statements.setdefault(statement, {'scale': extracted['scale'], 'values': {}})
+    if existing['scale'] != extracted['scale'] and existing['values']:
+        # Different units (e.g. a summary table in billions); keep the first table's fields
+        return
+    for field, value in extracted['values'].items():
+        existing['values'].setdefault(field, value)
+
+
+def stream_extract_statements(chunks, context_chars=500):
+    """
+    Streaming counterpart of the BeautifulSoup table pipeline: each <table> is
+    converted to rows when its end tag is parsed, then discarded together with
+    everything before it, so memory stays bounded by the largest table.
+    Returns the same {statement: {'scale', 'values'}} dict.
+    """
+    from lxml import etree
+
+    parser = etree.HTMLPullParser(events=("start", "end"))
+    statements = {}
+    recent_text = ""
+    table_depth = 0
+
+    def remember(text):
+        nonlocal recent_text
+        if text and text.strip():
+            recent_text = (recent_text + " " + text.strip())[-context_chars:]
+
+    def handle(events):
+        nonlocal recent_text, table_depth
+        for event, elem in events:
+            if event == "start":
+                if elem.tag == "table":
+                    table_depth += 1
+                continue
+
+            if elem.tag == "table":
+                table_depth -= 1
+            if table_depth:
+                # Inside a table: keep everything until the outermost table ends
+                continue
+
+            # Drop already-processed siblings, keeping their trailing text as context
+            parent = elem.getparent()
+            while parent is not None and elem.getprevious() is not None:
+                remember(parent[0].tail)
+                del parent[0]
+
+            if elem.tag == "table":
+                rows = [
+                    ["".join(cell.itertext()).strip() for cell in row if cell.tag in ("td", "th")]
+                    for row in elem.iter("tr")
+                ]
+                merge_statements(statements, *extract_table_statement(rows, recent_text))
+                recent_text = ""
+            else:
+                remember(" ".join(elem.itertext()))
+
+            elem.clear(keep_tail=True)
+
+    for chunk in chunks:
+        if chunk:
+            parser.feed(chunk)
+            handle(parser.read_events())
+
+    parser.close()
+    handle(parser.read_events())
+
+    return statements
+
+
+def _extract_metrics_per_pattern(text):
+    """Reference implementation: one re.findall per label, as parse_financial_statements used to do."""
+    financial_data = {}
+    for metric, labels in METRIC_LABELS.items():
+        for label in labels:
+            matches = re.findall(re.escape(label) + AMOUNT_PATTERN, text, re.IGNORECASE)
+            if matches:
+                financial_data[metric] = max(int(match.replace(',', '')) for match in matches)
+                break
+    return financial_data
+
+
+def benchmark(documents, repeat=5):
+    """
+    Time the single-pass engine against the per-pattern scans on recorded
+    filings (a list of plain-text documents) and check they agree.
+    """
+    import timeit
+
+    results = []
+    for text in documents:
+        expected = _extract_metrics_per_pattern(text)
+        actual = extract_metrics(text)
+        legacy = min(timeit.repeat(lambda: _extract_metrics_per_pattern(text), number=1, repeat=repeat))
+        single = min(timeit.repeat(lambda: extract_metrics(text), number=1, repeat=repeat))
+        results.append({
+            "chars": len(text),
+            "per_pattern_ms": legacy * 1000,
+            "single_pass_ms": single * 1000,
+            "speedup": legacy / single if single else float("inf"),
+            "identical": expected == actual,
+        })
+    return results
+
+
+if __name__ == "__main__":
+    # Usage: python -m utils.extraction [filing.htm ...]
+    # Without arguments, benchmarks the filings already in the on-disk cache.
+    import sys
+    from bs4 import BeautifulSoup
+
+    if sys.argv[1:]:
+        raw_documents = [open(path, "rb").read() for path in sys.argv[1:]]
+    else:
+        from utils.cache import get_filing_cache
+        cache = get_filing_cache()
+        raw_documents = [cache.get(url).content for url in cache.urls()]
+
+    documents = [BeautifulSoup(raw, "html.parser").get_text() for raw in raw_documents]
+
+    print(f"{'chars':>12} {'per-pattern ms':>15} {'single-pass ms':>15} {'speedup':>8}  identical")
+    for row in benchmark(documents):
+        print(
+            f"{row['chars']:>12,} {row['per_pattern_ms']:>15.1f} {row['single_pass_ms']:>15.1f} "
+            f"{row['speedup']:>7.1f}x  {row['identical']}"
+        )
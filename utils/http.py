@@ -0,0 +1,289 @@
+import os
+import time
+import random
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import logging
+copilot_logger = logging.getLogger("copilot")
+
+from sec_api import QueryApi, FullTextSearchApi
+
+from utils.rate_limit import get_upstream_limiter
+
+
+SEC_USER_AGENT = os.environ.get("SEC_USER_AGENT", "SEC Financial Parser 1.0 (research@example.com)")
+
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.environ.get("HTTP_MAX_CONNECTIONS_PER_HOST", 10))
+HTTP_MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", 3))
+HTTP_BACKOFF_SECONDS = float(os.environ.get("HTTP_BACKOFF_SECONDS", 0.5))
+HTTP_TIMEOUT_SECONDS = float(os.environ.get("HTTP_TIMEOUT_SECONDS", 15))
+
+# HTTP/2 needs the optional 'h2' package (pip install httpx[http2])
+HTTP2_ENABLED = os.environ.get("HTTP2_ENABLED", "false").lower() == "true"
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class HostStats:
+    """Request and connection counters for one host."""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self.retries = 0
+        self.errors = 0
+
+    @property
+    def connections_reused(self):
+        return max(self.requests - self.connections_opened, 0)
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "connections_reused": self.connections_reused,
+            "retries": self.retries,
+            "errors": self.errors,
+        }
+
+
+class HttpClientPool:
+    """
+    Process-wide pool of keep-alive httpx clients, one per host, so every host
+    gets its own connection limit. Requests are retried with exponential
+    backoff on transport errors and 429/5xx responses, and per-host counters
+    record how many requests reused an open connection.
+    """
+
+    def __init__(self, max_connections_per_host=HTTP_MAX_CONNECTIONS_PER_HOST,
+                 max_retries=HTTP_MAX_RETRIES, http2=HTTP2_ENABLED):
+        self.max_connections_per_host = max_connections_per_host
+        self.max_retries = max_retries
+        self.http2 = http2
+        self._clients = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def client(self, host):
+        """Return the shared httpx.Client for a host, creating it on first use."""
+        import httpx
+
+        with self._lock:
+            client = self._clients.get(host)
+            if client is None:
+                limits = httpx.Limits(
+                    max_connections=self.max_connections_per_host,
+                    max_keepalive_connections=self.max_connections_per_host,
+                )
+                stats = HostStats()
+                # Counted on every request the client sends, including those of
+                # libraries handed the client directly (the OpenAI SDK)
+                event_hooks = {"request": [self._on_request(stats)]}
+                try:
+                    client = httpx.Client(
+                        http2=self.http2, limits=limits, event_hooks=event_hooks,
+                        timeout=HTTP_TIMEOUT_SECONDS, follow_redirects=True
+                    )
+                except ImportError:
+                    copilot_logger.error("HTTP/2 requested but 'h2' is not installed; using HTTP/1.1.")
+                    client = httpx.Client(
+                        limits=limits, event_hooks=event_hooks,
+                        timeout=HTTP_TIMEOUT_SECONDS, follow_redirects=True
+                    )
+                self._clients[host] = client
+                self._stats[host] = stats
+            return client
+
+    def _trace(self, stats):
+        # httpcore reports connection setup through the "trace" request extension
+        def trace(event_name, info):
+            if event_name == "connection.connect_tcp.complete":
+                with self._lock:
+                    stats.connections_opened += 1
+        return trace
+
+    def _on_request(self, stats):
+        trace = self._trace(stats)
+
+        def on_request(request):
+            request.extensions.setdefault("trace", trace)
+            with self._lock:
+                stats.requests += 1
+        return on_request
+
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return HTTP_BACKOFF_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    @contextmanager
+    def stream(self, method, url, rate_limiter=None, limiter=None, **kwargs):
+        """
+        Send a request and yield the response with its body unread, for
+        streaming downloads. Retries happen before any of the body is consumed.
+        If given, rate_limiter.acquire() is called before every attempt, and
+        each attempt holds a slot of the AdaptiveLimiter limiter until its
+        response is closed, reporting 429s back to it.
+        """
+        host = urlsplit(url).netloc
+        client = self.client(host)
+        stats = self._stats[host]
+
+        import httpx
+
+        attempt = 0
+        while True:
+            if limiter is not None:
+                limiter.acquire()
+            # Exactly one release per acquire: the attempt's outcome, or (when
+            # the response is handed to the caller) once that response is closed
+            outcome, retry_after = "error", None
+            try:
+                if rate_limiter is not None:
+                    rate_limiter.acquire()
+
+                try:
+                    request = client.build_request(method, url, **kwargs)
+                    response = client.send(request, stream=True)
+                except httpx.TransportError:
+                    if attempt >= self.max_retries:
+                        with self._lock:
+                            stats.errors += 1
+                        raise
+                    delay = self._backoff(attempt)
+                else:
+                    if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                        outcome = None
+                        break
+                    delay = self._backoff(attempt, response)
+                    if response.status_code == 429:
+                        outcome, retry_after = "rate_limited", delay
+                    # Drain the (small) error body so the connection stays reusable
+                    try:
+                        response.read()
+                    finally:
+                        response.close()
+            finally:
+                if limiter is not None and outcome is not None:
+                    limiter.release(outcome, retry_after=retry_after)
+
+            with self._lock:
+                stats.retries += 1
+            attempt += 1
+            time.sleep(delay)
+
+        try:
+            yield response
+        finally:
+            try:
+                response.close()
+            finally:
+                if limiter is not None:
+                    if response.status_code == 429:
+                        limiter.release("rate_limited")
+                    else:
+                        limiter.release("ok" if response.status_code < 500 else "error")
+
+    def request(self, method, url, rate_limiter=None, limiter=None, **kwargs):
+        """Send a request with retries and return the fully read httpx.Response."""
+        with self.stream(method, url, rate_limiter=rate_limiter, limiter=limiter, **kwargs) as response:
+            response.read()
+            return response
+
+    def stats(self):
+        """Per-host request, connection reuse and retry counters."""
+        with self._lock:
+            return {host: stats.as_dict() for host, stats in self._stats.items()}
+
+    def close(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+
+_http_pool = None
+_requests_session = None
+_http_lock = threading.Lock()
+
+
+def get_http_pool():
+    """Return the process-wide HttpClientPool."""
+    global _http_pool
+    if _http_pool is None:
+        with _http_lock:
+            if _http_pool is None:
+                _http_pool = HttpClientPool()
+    return _http_pool
+
+
+def get_requests_session():
+    """
+    Process-wide pooled requests.Session for libraries that only accept a
+    requests session (yfinance), with keep-alive pools and retries on 5xx.
+    """
+    global _requests_session
+    if _requests_session is None:
+        with _http_lock:
+            if _requests_session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+
+                retry = Retry(
+                    total=HTTP_MAX_RETRIES, backoff_factor=HTTP_BACKOFF_SECONDS,
+                    status_forcelist=[500, 502, 503, 504], allowed_methods=None
+                )
+                adapter = HTTPAdapter(
+                    pool_connections=8, pool_maxsize=HTTP_MAX_CONNECTIONS_PER_HOST, max_retries=retry
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _requests_session = session
+    return _requests_session
+
+
+def pool_stats():
+    """Connection statistics for the httpx pool and the shared requests session."""
+    stats = dict(get_http_pool().stats())
+
+    if _requests_session is not None:
+        adapter = _requests_session.get_adapter("https://")
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            stats[f"{pool.host} (requests)"] = {
+                "requests": pool.num_requests,
+                "connections_opened": pool.num_connections,
+                "connections_reused": max(pool.num_requests - pool.num_connections, 0),
+            }
+
+    return stats
+
+
+class PooledQueryApi(QueryApi):
+    """sec-api.io Query API client that sends requests through the shared HTTP pool."""
+
+    def get_filings(self, query):
+        response = get_http_pool().request(
+            "POST", self.api_endpoint, json=query, limiter=get_upstream_limiter("sec-api")
+        )
+        if response.status_code == 200:
+            return response.json()
+        raise Exception("API error: {} - {}".format(response.status_code, response.text))
+
+
+class PooledFullTextSearchApi(FullTextSearchApi):
+    """sec-api.io Full-Text Search API client that sends requests through the shared HTTP pool."""
+
+    def get_filings(self, query):
+        response = get_http_pool().request(
+            "POST", self.api_endpoint, json=query, limiter=get_upstream_limiter("sec-api")
+        )
+        if response.status_code == 200:
+            return response.json()
+        raise Exception("API error: {} - {}".format(response.status_code, response.text))
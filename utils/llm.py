@@ -0,0 +1,168 @@
+import os
+import time
+import hashlib
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import logging
+copilot_logger = logging.getLogger("copilot")
+
+from langchain_openai import ChatOpenAI
+
+from utils.http import get_http_pool
+
+
+DEFAULT_CHAT_MODEL = "gpt-3.5-turbo-16k"
+
+# Concurrent completions allowed per OpenAI API key, across every session
+LLM_MAX_CONCURRENCY_PER_KEY = int(os.environ.get("LLM_MAX_CONCURRENCY_PER_KEY", 4))
+
+# Latency samples kept per model for the percentile metrics
+LLM_LATENCY_WINDOW = 256
+
+
+def key_fingerprint(api_key):
+    """Short, non-reversible label for an API key, safe to log and use in metrics."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8]
+
+
+class LLMStats:
+    """Request counters and recent latencies for one (key, model) pair."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.waiting = 0
+        self.latencies = deque(maxlen=LLM_LATENCY_WINDOW)
+
+    def as_dict(self):
+        latencies = sorted(self.latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return latencies[min(int(p * len(latencies)), len(latencies) - 1)]
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "waiting": self.waiting,
+            "p50_seconds": percentile(0.50),
+            "p95_seconds": percentile(0.95),
+        }
+
+
+class PooledChatOpenAI(ChatOpenAI):
+    """ChatOpenAI whose calls take a concurrency slot from the registry and report their latency."""
+
+    pool_key: str = ""
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        with get_llm_registry().slot(self.pool_key, self.model_name):
+            return super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        with get_llm_registry().slot(self.pool_key, self.model_name):
+            yield from super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+class LLMRegistry:
+    """
+    Process-wide registry of chat model clients keyed by (API key, model,
+    params). Every client shares the pooled OpenAI HTTP connections, calls
+    made with the same API key share a concurrency limit, and latencies are
+    recorded per key and model.
+    """
+
+    def __init__(self, max_concurrency_per_key=LLM_MAX_CONCURRENCY_PER_KEY):
+        self.max_concurrency_per_key = max_concurrency_per_key
+        self._models = {}
+        self._semaphores = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def chat_model(self, api_key, model=DEFAULT_CHAT_MODEL, **params):
+        """Return the shared chat model for an API key, model and parameters."""
+        fingerprint = key_fingerprint(api_key)
+        registry_key = (api_key, model, tuple(sorted(params.items())))
+
+        with self._lock:
+            chat_model = self._models.get(registry_key)
+            if chat_model is None:
+                chat_model = PooledChatOpenAI(
+                    model=model,
+                    openai_api_key=api_key,
+                    http_client=get_http_pool().client("api.openai.com"),
+                    pool_key=fingerprint,
+                    **params
+                )
+                self._models[registry_key] = chat_model
+                self._semaphores.setdefault(
+                    fingerprint, threading.BoundedSemaphore(self.max_concurrency_per_key)
+                )
+            return chat_model
+
+    @contextmanager
+    def slot(self, fingerprint, model):
+        """Hold one of the key's concurrency slots and time the call made inside it."""
+        # ChatOpenAI._generate delegates to _stream when streaming is on;
+        # the nested call runs in the slot the outer one already holds
+        if getattr(self._local, "in_slot", False):
+            yield
+            return
+
+        with self._lock:
+            semaphore = self._semaphores.setdefault(
+                fingerprint, threading.BoundedSemaphore(self.max_concurrency_per_key)
+            )
+            stats = self._stats.setdefault((fingerprint, model), LLMStats())
+            stats.waiting += 1
+
+        semaphore.acquire()
+        with self._lock:
+            stats.waiting -= 1
+            stats.requests += 1
+
+        self._local.in_slot = True
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            with self._lock:
+                stats.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self._local.in_slot = False
+            semaphore.release()
+            with self._lock:
+                stats.latencies.append(elapsed)
+
+    def stats(self):
+        """Latency and request counters per '<key fingerprint>/<model>'."""
+        with self._lock:
+            return {
+                f"{fingerprint}/{model}": stats.as_dict()
+                for (fingerprint, model), stats in self._stats.items()
+            }
+
+
+_llm_registry = None
+_llm_registry_lock = threading.Lock()
+
+
+def get_llm_registry():
+    """Return the process-wide LLMRegistry."""
+    global _llm_registry
+    if _llm_registry is None:
+        with _llm_registry_lock:
+            if _llm_registry is None:
+                _llm_registry = LLMRegistry()
+    return _llm_registry
+
+
+def get_chat_model(api_key, model=DEFAULT_CHAT_MODEL, **params):
+    """Shared chat model for an API key; see LLMRegistry.chat_model."""
+    return get_llm_registry().chat_model(api_key, model, **params)
@@ -0,0 +1,107 @@
+import os
+import json
+import threading
+
+import logging
+copilot_logger = logging.getLogger("copilot")
+
+from utils.cache import TTLCache
+
+
+# A crew run or chat session reuses a tool result for this long
+TOOL_MEMO_TTL_SECONDS = int(os.environ.get("TOOL_MEMO_TTL_SECONDS", 600))
+
+# Tools whose results are also shared between runs and sessions, comma separated
+# names (e.g. "SEC API Filing Search"); empty keeps every memo run-scoped
+TOOL_CACHE_PROMOTE = {
+    name.strip() for name in os.environ.get("TOOL_CACHE_PROMOTE", "").split(",") if name.strip()
+}
+TOOL_CACHE_TTL_SECONDS = int(os.environ.get("TOOL_CACHE_TTL_SECONDS", 3600))
+
+# Tool outputs that report a failure rather than a result are never memoized
+TOOL_ERROR_PREFIXES = (
+    "An error occurred",
+    "I encountered an error",
+    "Unable to retrieve",
+    "Yahoo Finance is currently rate-limiting",
+    "⚠️ Web search is currently rate-limited",
+)
+
+
+class _Uncacheable(Exception):
+    """Carries a tool output out of TTLCache.get_or_load without caching it."""
+
+    def __init__(self, output):
+        super().__init__("uncacheable tool output")
+        self.output = output
+
+
+def normalize_tool_input(value):
+    """Case, surrounding quotes/punctuation and whitespace do not change a tool call."""
+    if isinstance(value, str):
+        return " ".join(value.lower().split()).strip(" .?!\"'")
+    if isinstance(value, dict):
+        return {str(k): normalize_tool_input(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_tool_input(v) for v in value]
+    return value
+
+
+def tool_call_key(tool_name, args, kwargs):
+    return json.dumps(
+        [tool_name, normalize_tool_input(list(args)), normalize_tool_input(kwargs)],
+        sort_keys=True, separators=(",", ":"), default=str
+    )
+
+
+_tool_cache = None
+_tool_cache_lock = threading.Lock()
+
+
+def get_tool_cache():
+    """Process-wide cache for tools listed in TOOL_CACHE_PROMOTE."""
+    global _tool_cache
+    if _tool_cache is None:
+        with _tool_cache_lock:
+            if _tool_cache is None:
+                _tool_cache = TTLCache(TOOL_CACHE_TTL_SECONDS)
+    return _tool_cache
+
+
+def new_tool_memo(ttl=TOOL_MEMO_TTL_SECONDS):
+    """A memo scope for one crew run or chat session."""
+    return TTLCache(ttl)
+
+
+def memoize_tool(tool, memo, promote=None):
+    """
+    Return a copy of a LangChain tool whose calls are memoized in memo, keyed
+    on the tool name and normalized input. Concurrent identical calls share
+    one execution. Promoted tools (TOOL_CACHE_PROMOTE by default) fill the
+    memo from the process-wide tool cache.
+    """
+    if promote is None:
+        promote = tool.name in TOOL_CACHE_PROMOTE
+    func = tool.func
+
+    def call(*args, **kwargs):
+        output = func(*args, **kwargs)
+        if isinstance(output, str) and output.startswith(TOOL_ERROR_PREFIXES):
+            raise _Uncacheable(output)
+        return output
+
+    def memoized(*args, **kwargs):
+        key = tool_call_key(tool.name, args, kwargs)
+        load = lambda: call(*args, **kwargs)
+        if promote:
+            load = lambda: get_tool_cache().get_or_load(key, lambda: call(*args, **kwargs))
+        try:
+            return memo.get_or_load(key, load)
+        except _Uncacheable as e:
+            return e.output
+
+    return tool.copy(update={"func": memoized})
+
+
+def memoize_tools(tools, memo):
+    return [memoize_tool(tool, memo) for tool in tools]
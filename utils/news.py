@@ -0,0 +1,237 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import logging
+copilot_logger = logging.getLogger("copilot")
+
+from utils.rate_limit import get_upstream_limiter
+
+
+# Search results are fresh for NEWS_CACHE_TTL_SECONDS; after that they are
+# still served for up to NEWS_STALE_SECONDS more while a refresh runs
+NEWS_CACHE_TTL_SECONDS = int(os.environ.get("NEWS_CACHE_TTL_SECONDS", 900))
+NEWS_STALE_SECONDS = int(os.environ.get("NEWS_STALE_SECONDS", 3600))
+NEWS_CACHE_MAX_ENTRIES = 512
+
+# Results asked for per search, and headlines kept per query after merging
+NEWS_MAX_RESULTS = int(os.environ.get("NEWS_MAX_RESULTS", 10))
+NEWS_MAX_HEADLINES = 15
+
+NEWS_REFRESH_WORKERS = 2
+
+# Words that rephrase a news query without changing what it is about
+NEWS_FILLER_WORDS = {
+    "a", "about", "an", "and", "any", "for", "from", "headlines", "in", "is",
+    "last", "latest", "new", "news", "of", "on", "recent", "regarding", "stories",
+    "the", "this", "today", "todays", "top", "update", "updates", "week", "what", "whats",
+}
+
+Headline = namedtuple("Headline", ["title", "url", "source", "date", "body"])
+
+
+def normalize_news_query(query):
+    """
+    Canonical form of a search query: lowercase words without punctuation or
+    filler, sorted, so "Apple news", "latest news on Apple" and "apple
+    recent news" share one cache entry.
+    """
+    words = re.findall(r"[a-z0-9&.$-]+", query.lower().replace("'", ""))
+    words = [word.strip(".-") for word in words]
+    kept = sorted({word for word in words if word and word not in NEWS_FILLER_WORDS})
+    return " ".join(kept) or " ".join(query.lower().split())
+
+
+def headline_keys(headline):
+    """Identities a headline is de-duplicated on: its URL and a hash of its title."""
+    keys = []
+    if headline.url:
+        url = re.sub(r"^https?://(www\.)?", "", headline.url.lower())
+        keys.append("url:" + url.split("?", 1)[0].split("#", 1)[0].rstrip("/"))
+    title = " ".join(re.findall(r"\w+", (headline.title or "").lower()))
+    if title:
+        keys.append("title:" + hashlib.sha1(title.encode("utf-8")).hexdigest()[:16])
+    return keys
+
+
+def merge_headlines(*groups, limit=NEWS_MAX_HEADLINES):
+    """Merge headline lists, newest first, dropping repeats of a URL or title."""
+    seen = set()
+    merged = []
+    headlines = [headline for group in groups for headline in group]
+    # ISO dates sort correctly as strings; undated results go last
+    for headline in sorted(headlines, key=lambda h: h.date or "", reverse=True):
+        keys = headline_keys(headline)
+        if any(key in seen for key in keys):
+            continue
+        seen.update(keys)
+        merged.append(headline)
+    return merged[:limit]
+
+
+def search_news(query, max_results=NEWS_MAX_RESULTS):
+    """News results for a query from DuckDuckGo, falling back to web results when there are none."""
+    from duckduckgo_search import DDGS
+
+    with DDGS() as ddgs:
+        results = [
+            Headline(r.get("title"), r.get("url"), r.get("source"), r.get("date"), r.get("body"))
+            for r in ddgs.news(query, max_results=max_results) or []
+        ]
+        if not results:
+            results = [
+                Headline(r.get("title"), r.get("href"), None, None, r.get("body"))
+                for r in ddgs.text(query, max_results=max_results) or []
+            ]
+    return results
+
+
+def format_headlines(headlines):
+    """Render headlines as the text the agents get back from the search tool."""
+    lines = []
+    for headline in headlines:
+        meta = ", ".join(part for part in (headline.source, (headline.date or "")[:10]) if part)
+        lines.append(f"- {headline.title}" + (f" ({meta})" if meta else ""))
+        if headline.body:
+            lines.append(f"  {headline.body}")
+        if headline.url:
+            lines.append(f"  {headline.url}")
+    return "\n".join(lines)
+
+
+class _PendingSearch:
+    def __init__(self):
+        self.done = threading.Event()
+        self.headlines = None
+        self.error = None
+
+
+class NewsSearchCache:
+    """
+    Process-wide news search layer. Queries are normalized so rephrasings
+    share an entry, concurrent searches for one entry share a request, and
+    stale entries are served while they are refreshed in the background
+    (stale-while-revalidate). Each refresh merges the new results into the
+    entry, de-duplicated by URL and title. When a search fails, the last
+    results are served instead of an error.
+    """
+
+    def __init__(self, ttl=NEWS_CACHE_TTL_SECONDS, stale=NEWS_STALE_SECONDS,
+                 max_entries=NEWS_CACHE_MAX_ENTRIES, search=search_news):
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entries = max_entries
+        self._search = search
+        self._entries = {}  # key -> (headlines, fetched_at, query)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=NEWS_REFRESH_WORKERS, thread_name_prefix="news-refresh"
+        )
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.searches = 0
+        self.errors = 0
+
+    def _fetch(self, key, query):
+        """Search upstream and merge the results into the entry for key."""
+        pending = self._pending[key]
+        try:
+            results = get_upstream_limiter("duckduckgo").run(self._search, query)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+                del self._pending[key]
+                entry = self._entries.get(key)
+            pending.headlines = entry[0] if entry is not None else None
+            pending.error = e
+            pending.done.set()
+            copilot_logger.error(f"News search failed for '{query}': {str(e)}")
+            return
+
+        with self._lock:
+            self.searches += 1
+            previous = self._entries.get(key)
+            headlines = merge_headlines(results, previous[0] if previous is not None else [])
+            self._entries[key] = (headlines, time.time(), query)
+            if len(self._entries) > self.max_entries:
+                oldest = min(self._entries, key=lambda k: self._entries[k][1])
+                del self._entries[oldest]
+            del self._pending[key]
+        pending.headlines = headlines
+        pending.done.set()
+
+    def get(self, query):
+        """
+        Return the headlines for a query. Raises the search error only when
+        the search fails and nothing was cached for the query.
+        """
+        key = normalize_news_query(query)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                headlines, fetched_at, _ = entry
+                age = now - fetched_at
+                if age < self.ttl:
+                    self.hits += 1
+                    return headlines
+                if age < self.ttl + self.stale:
+                    self.stale_hits += 1
+                    if key not in self._pending:
+                        self._pending[key] = _PendingSearch()
+                        self._executor.submit(self._fetch, key, query)
+                    return headlines
+
+            pending = self._pending.get(key)
+            if pending is not None:
+                self.coalesced += 1
+                owner = False
+            else:
+                self.misses += 1
+                pending = self._pending[key] = _PendingSearch()
+                owner = True
+
+        if owner:
+            self._fetch(key, query)
+        else:
+            pending.done.wait()
+
+        if pending.headlines is None:
+            raise pending.error
+        return pending.headlines
+
+    def stats(self):
+        with self._lock:
+            served = self.hits + self.stale_hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "searches": self.searches,
+                "errors": self.errors,
+                "entries": len(self._entries),
+                "hit_rate": (self.hits + self.stale_hits) / served if served else 0.0,
+            }
+
+
+_news_cache = None
+_news_cache_lock = threading.Lock()
+
+
+def get_news_cache():
+    """Return the process-wide NewsSearchCache."""
+    global _news_cache
+    if _news_cache is None:
+        with _news_cache_lock:
+            if _news_cache is None:
+                _news_cache = NewsSearchCache()
+    return _news_cache
@@ -0,0 +1,275 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import logging
+copilot_logger = logging.getLogger("copilot")
+
+from utils.cache import CACHE_DIR
+from utils.http import get_requests_session
+from utils.rate_limit import get_upstream_limiter, is_rate_limit_error, RateLimitedError
+from utils.quotes import yfinance_lock
+
+
+# Parquet store of daily price history, one partition per ticker: <PRICES_DIR>/ticker=<TICKER>/history.parquet
+PRICES_DIR = os.environ.get("PRICE_HISTORY_DIR", os.path.join(CACHE_DIR, "prices"))
+
+# History fetched the first time a ticker is seen, and how often its latest bars are topped up
+PRICE_HISTORY_YEARS = int(os.environ.get("PRICE_HISTORY_YEARS", 5))
+PRICE_HISTORY_REFRESH_SECONDS = int(os.environ.get("PRICE_HISTORY_REFRESH_SECONDS", 3600))
+
+# Tickers kept decoded in memory by PriceHistoryStore
+PRICE_STORE_MAX_TICKERS = 64
+
+TRADING_DAYS_PER_YEAR = 252
+
+PRICE_COLUMNS = ["open", "high", "low", "close", "adj_close", "volume"]
+
+
+def download_history(ticker, start, end):
+    """
+    Daily bars for one ticker from start to end (inclusive, ISO dates) as a
+    DataFrame indexed by date with PRICE_COLUMNS.
+    """
+    import pandas as pd
+    import yfinance as yf
+
+    with yfinance_lock:
+        data = yf.download(
+            ticker, start=start, end=(date.fromisoformat(end) + timedelta(days=1)).isoformat(),
+            interval="1d", auto_adjust=False, progress=False, threads=False,
+            session=get_requests_session()
+        )
+        errors = dict(getattr(getattr(yf, "shared", None), "_ERRORS", {}) or {})
+
+    # A failed download must not be recorded as a range without bars
+    error = errors.get(ticker)
+    if error is not None:
+        if is_rate_limit_error(error):
+            raise RateLimitedError("Yahoo Finance rate limit")
+        raise RuntimeError(f"Price history download failed for {ticker}: {error}")
+
+    if isinstance(data.columns, pd.MultiIndex):
+        data.columns = data.columns.get_level_values(0)
+
+    data = data.rename(columns=lambda c: str(c).lower().replace(" ", "_"))
+    data = data.reindex(columns=PRICE_COLUMNS).dropna(subset=["close"])
+    data.index = pd.DatetimeIndex(data.index).tz_localize(None).normalize()
+    data.index.name = "date"
+    return data.astype("float64")
+
+
+def _empty_history():
+    import pandas as pd
+    return pd.DataFrame(
+        columns=PRICE_COLUMNS, index=pd.DatetimeIndex([], name="date"), dtype="float64"
+    )
+
+
+def _partition_path(prices_dir, ticker):
+    return os.path.join(prices_dir, f"ticker={ticker}", "history.parquet")
+
+
+class PriceHistoryStore:
+    """
+    Local Parquet store of daily price history. Each ticker's partition
+    records the date range it covers; a request only downloads the dates
+    outside that range, and the latest bars at most once per
+    PRICE_HISTORY_REFRESH_SECONDS. Partitions are decoded once and kept in
+    a small LRU, so repeated queries are served from memory.
+    """
+
+    def __init__(self, prices_dir=PRICES_DIR, max_tickers=PRICE_STORE_MAX_TICKERS,
+                 download=download_history):
+        self.prices_dir = prices_dir
+        self.max_tickers = max_tickers
+        self._download = download
+        self._frames = OrderedDict()  # ticker -> (mtime, frame, meta)
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _ticker_lock(self, ticker):
+        with self._lock:
+            return self._locks.setdefault(ticker, threading.Lock())
+
+    def _load(self, ticker):
+        """Return (frame, meta) for a ticker's partition, or (None, {}) if there is none."""
+        path = _partition_path(self.prices_dir, ticker)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None, {}
+
+        with self._lock:
+            cached = self._frames.get(ticker)
+            if cached is not None and cached[0] == mtime:
+                self._frames.move_to_end(ticker)
+                return cached[1], cached[2]
+
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+        meta = {k.decode(): v.decode() for k, v in (table.schema.metadata or {}).items()
+                if not k.startswith(b"pandas")}
+        frame = table.to_pandas()
+
+        with self._lock:
+            self._frames[ticker] = (mtime, frame, meta)
+            self._frames.move_to_end(ticker)
+            while len(self._frames) > self.max_tickers:
+                self._frames.popitem(last=False)
+
+        return frame, meta
+
+    def _save(self, ticker, frame, meta):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        path = _partition_path(self.prices_dir, ticker)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        table = pa.Table.from_pandas(frame, preserve_index=True)
+        metadata = dict(table.schema.metadata or {})
+        metadata.update({k.encode(): str(v).encode() for k, v in meta.items()})
+        table = table.replace_schema_metadata(metadata)
+
+        # Written next to the partition and swapped in, so readers never see half a file
+        tmp_path = path + ".tmp"
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+
+    def _missing_ranges(self, meta, start, end):
+        """Date ranges in [start, end] the partition does not cover yet."""
+        if not meta:
+            return [(start, end)]
+
+        ranges = []
+        if start < meta["covered_from"]:
+            day_before = date.fromisoformat(meta["covered_from"]) - timedelta(days=1)
+            ranges.append((start, day_before.isoformat()))
+        # Today's bar changes until the close, so it is topped up once it is stale
+        today = date.today().isoformat()
+        stale = time.time() - float(meta["fetched_at"]) > PRICE_HISTORY_REFRESH_SECONDS
+        if end > meta["covered_to"] or (end == meta["covered_to"] == today and stale):
+            ranges.append((meta["covered_to"], end))
+        return ranges
+
+    def history(self, ticker, start=None, end=None):
+        """
+        Daily bars for a ticker between start and end (ISO dates, default the
+        last PRICE_HISTORY_YEARS years up to today), downloading only what the
+        local store does not cover. Returns a DataFrame indexed by date.
+        """
+        import pandas as pd
+
+        ticker = ticker.strip().upper()
+        end = min(end or date.today().isoformat(), date.today().isoformat())
+        start = start or (date.today() - timedelta(days=365 * PRICE_HISTORY_YEARS)).isoformat()
+
+        with self._ticker_lock(ticker):
+            frame, meta = self._load(ticker)
+            ranges = self._missing_ranges(meta, start, end)
+
+            if ranges:
+                fetched = [
+                    get_upstream_limiter("yahoo").run(self._download, ticker, range_start, range_end)
+                    for range_start, range_end in ranges
+                ]
+                parts = [part for part in [frame] + fetched if part is not None and len(part)]
+                # Ranges without bars (unknown ticker, holidays) are recorded as
+                # covered too, so they are not downloaded again on every call
+                frame = pd.concat(parts) if parts else _empty_history()
+                frame = frame[~frame.index.duplicated(keep="last")].sort_index()
+                meta = {
+                    "covered_from": min(start, meta.get("covered_from", start)),
+                    "covered_to": max(end, meta.get("covered_to", end)),
+                    "fetched_at": time.time(),
+                }
+                self._save(ticker, frame, meta)
+                copilot_logger.info(
+                    f"Price history for {ticker}: fetched "
+                    + ", ".join(f"{a}..{b}" for a, b in ranges)
+                    + f", {len(frame)} bars stored"
+                )
+
+        if frame is None:
+            return _empty_history()
+        return frame.loc[start:end]
+
+
+def return_metrics(close):
+    """Total return, annualized volatility and maximum drawdown of a close price series."""
+    import numpy as np
+
+    prices = close.to_numpy(dtype="float64")
+    if len(prices) < 2:
+        return None
+
+    log_returns = np.diff(np.log(prices))
+    running_peak = np.maximum.accumulate(prices)
+    drawdowns = prices / running_peak - 1
+    trough = int(np.argmin(drawdowns))
+    peak = int(np.argmax(prices[:trough + 1]))
+
+    return {
+        "start": close.index[0].date().isoformat(),
+        "end": close.index[-1].date().isoformat(),
+        "trading_days": len(prices),
+        "total_return": float(prices[-1] / prices[0] - 1),
+        "annualized_return": float((prices[-1] / prices[0]) ** (TRADING_DAYS_PER_YEAR / (len(prices) - 1)) - 1),
+        "annualized_volatility": float(np.std(log_returns, ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR))
+        if len(log_returns) > 1 else 0.0,
+        "max_drawdown": float(drawdowns[trough]),
+        "drawdown_peak": close.index[peak].date().isoformat(),
+        "drawdown_trough": close.index[trough].date().isoformat(),
+    }
+
+
+def filing_window_returns(close, filing_dates, window=5):
+    """
+    Price behavior around each filing date, computed for all filings at once:
+    the return over the `window` trading days before the filing, over the
+    `window` trading days from the filing on, and from the filing until the
+    next filing (or the last close). Returns a DataFrame indexed by filing date.
+    """
+    import numpy as np
+    import pandas as pd
+
+    prices = close.to_numpy(dtype="float64")
+    filed = pd.DatetimeIndex(sorted(set(pd.to_datetime(filing_dates))))
+    # Close before the filing is at pos - 1; the filing-day session is at pos
+    pos = np.searchsorted(close.index.values, filed.values, side="left")
+    valid = (pos >= 1) & (pos < len(prices))
+    filed, pos = filed[valid], pos[valid]
+    if not len(pos):
+        return pd.DataFrame(columns=["pre_return", "post_return", "to_next_filing"])
+
+    def ratio(later, earlier):
+        ok = (earlier >= 0) & (later < len(prices)) & (later > earlier)
+        out = np.full(len(later), np.nan)
+        out[ok] = prices[later[ok]] / prices[earlier[ok]] - 1
+        return out
+
+    base = pos - 1
+    next_pos = np.append(pos[1:] - 1, len(prices) - 1)
+
+    return pd.DataFrame({
+        "pre_return": ratio(base, base - window),
+        "post_return": ratio(base + window, base),
+        "to_next_filing": ratio(next_pos, base),
+    }, index=filed)
+
+
+_price_store = None
+_price_store_lock = threading.Lock()
+
+
+def get_price_store():
+    """Return the process-wide PriceHistoryStore, creating it on first use."""
+    global _price_store
+    if _price_store is None:
+        with _price_store_lock:
+            if _price_store is None:
+                _price_store = PriceHistoryStore()
+    return _price_store
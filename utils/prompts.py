@@ -1,3 +1,5 @@
+import hashlib
+
 from langchain_core.prompts import ChatPromptTemplate
 
 template = """You are an investment assistant helping users understand company finances through SEC filings.
@@ -29,6 +31,9 @@ Answer based only on the context provided, and always present extracted financia
 
 prompt = ChatPromptTemplate.from_template(template)
 
+# Part of the answer cache key: editing the template retires cached answers
+PROMPT_VERSION = hashlib.sha256(template.encode("utf-8")).hexdigest()[:12]
+
 
 react_template = """You are designed to help stock market investors understand company financials 
 as well as stock values before making investment decisions.
@@ -40,7 +45,7 @@ You have access to the following tools:
 
 {tools}
 
-If you decide to use the vector store tool, the action input should be the new input from the user. If you decide to use the get_current_stock_price tool, the action input should 
+If you decide to use the vector store tool, the action input should be the new input from the user. If you decide to use the get_current_stock_price or get_price_history_analysis tool, the action input should 
 be only the ticker symbol of the company.
 
 To use a tool, please use the following format:
@@ -70,3 +75,18 @@ New input: {input}
 
 react_prompt = ChatPromptTemplate.from_template(react_template)
 
+
+
+summary_template = """Progressively summarize the conversation between a user and an investment assistant, 
+adding onto the previous summary and returning a new summary. Keep the companies, tickers, filings and 
+figures that were discussed; drop pleasantries.
+
+Current summary:
+{summary}
+
+New lines of conversation:
+{new_lines}
+
+New summary:"""
+
+summary_prompt = ChatPromptTemplate.from_template(summary_template)
@@ -0,0 +1,223 @@
+import os
+import time
+import threading
+from collections import namedtuple
+
+import logging
+copilot_logger = logging.getLogger("copilot")
+
+from utils.http import get_requests_session
+from utils.rate_limit import get_upstream_limiter, is_rate_limit_error, RateLimitedError
+
+
+# Quotes are fresh for QUOTE_TTL_SECONDS; after that they are still served for
+# up to QUOTE_STALE_SECONDS more while a refresh runs in the background.
+QUOTE_TTL_SECONDS = int(os.environ.get("QUOTE_TTL_SECONDS", 300))
+QUOTE_STALE_SECONDS = int(os.environ.get("QUOTE_STALE_SECONDS", 3600))
+
+# Unknown tickers are remembered briefly so they are not refetched on every call
+QUOTE_NEGATIVE_TTL_SECONDS = 60
+
+# Requests arriving within this window are fetched together
+QUOTE_BATCH_WINDOW_SECONDS = float(os.environ.get("QUOTE_BATCH_WINDOW_SECONDS", 0.1))
+QUOTE_MAX_BATCH_SIZE = 50
+QUOTE_DOWNLOAD_THREADS = 4
+
+# yf.download resets and reads module-level dicts (yf.shared._DFS, _ERRORS),
+# so concurrent downloads in one process mix up or lose each other's results.
+# Every yf.download call in the process holds this lock.
+yfinance_lock = threading.Lock()
+
+Quote = namedtuple("Quote", ["ticker", "price", "previous_close", "as_of", "fetched_at"])
+
+
+class _PendingQuote:
+    def __init__(self):
+        self.done = threading.Event()
+        self.quote = None
+        self.error = None
+
+
+def download_quotes(tickers):
+    """Fetch the latest daily close for several tickers with one yf.download call."""
+    import pandas as pd
+    import yfinance as yf
+
+    with yfinance_lock:
+        data = yf.download(
+            tickers, period="5d", interval="1d", group_by="ticker", auto_adjust=False,
+            progress=False, threads=min(len(tickers), QUOTE_DOWNLOAD_THREADS),
+            session=get_requests_session()
+        )
+        # yf.download reports per-ticker failures in yf.shared._ERRORS instead of raising
+        errors = dict(getattr(getattr(yf, "shared", None), "_ERRORS", {}) or {})
+    if any(is_rate_limit_error(error) for error in errors.values()):
+        raise RateLimitedError("Yahoo Finance rate limit")
+
+    quotes = {}
+    fetched_at = time.time()
+    for ticker in tickers:
+        if isinstance(data.columns, pd.MultiIndex):
+            if ticker not in data.columns.get_level_values(0):
+                continue
+            frame = data[ticker]
+        else:
+            frame = data
+        closes = frame["Close"].dropna() if "Close" in frame else []
+        if len(closes) == 0:
+            continue
+        quotes[ticker] = Quote(
+            ticker=ticker,
+            price=float(closes.iloc[-1]),
+            previous_close=float(closes.iloc[-2]) if len(closes) > 1 else None,
+            as_of=str(closes.index[-1].date()),
+            fetched_at=fetched_at,
+        )
+    return quotes
+
+
+class QuoteService:
+    """
+    Process-wide stock quote service. Ticker requests from every session are
+    collected over a short window and fetched together, results are cached
+    with a TTL, and stale quotes are served while they are refreshed in the
+    background (stale-while-revalidate).
+    """
+
+    def __init__(self, ttl=QUOTE_TTL_SECONDS, stale=QUOTE_STALE_SECONDS,
+                 batch_window=QUOTE_BATCH_WINDOW_SECONDS, fetch=download_quotes):
+        self.ttl = ttl
+        self.stale = stale
+        self.batch_window = batch_window
+        self._fetch = fetch
+        self._quotes = {}  # ticker -> (Quote or None, fetched_at)
+        self._pending = {}
+        self._flush_scheduled = False
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.tickers_fetched = 0
+
+    def _request(self, ticker):
+        # Caller holds self._lock
+        pending = self._pending.get(ticker)
+        if pending is None:
+            pending = self._pending[ticker] = _PendingQuote()
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            timer = threading.Timer(self.batch_window, self._flush)
+            timer.daemon = True
+            timer.start()
+        return pending
+
+    def _flush(self):
+        with self._lock:
+            batch = self._pending
+            self._pending = {}
+            self._flush_scheduled = False
+
+        tickers = list(batch)
+        quotes = {}
+        errors = {}
+        for start in range(0, len(tickers), QUOTE_MAX_BATCH_SIZE):
+            chunk = tickers[start:start + QUOTE_MAX_BATCH_SIZE]
+            try:
+                quotes.update(get_upstream_limiter("yahoo").run(self._fetch, chunk))
+            except Exception as e:
+                copilot_logger.error(f"Quote download failed for {', '.join(chunk)}: {str(e)}")
+                errors.update((ticker, e) for ticker in chunk)
+
+        now = time.time()
+        with self._lock:
+            self.batches += 1
+            self.tickers_fetched += len(tickers)
+            for ticker in tickers:
+                quote = quotes.get(ticker)
+                previous = self._quotes.get(ticker)
+                if (quote is None and previous is not None and previous[0] is not None
+                        and now - previous[1] < self.ttl + self.stale):
+                    # Keep serving the last good quote within the stale window rather than forgetting it
+                    quotes[ticker] = previous[0]
+                    continue
+                if ticker in errors:
+                    # A failed fetch is not a "no data" answer; the next request retries it
+                    continue
+                self._quotes[ticker] = (quote, now)
+
+        for ticker, pending in batch.items():
+            pending.quote = quotes.get(ticker)
+            pending.error = errors.get(ticker)
+            pending.done.set()
+
+    def get_quote(self, ticker, timeout=15):
+        """
+        Return the Quote for a ticker, or None if Yahoo has no data for it.
+        Raises the download error (e.g. RateLimitedError) when the fetch
+        failed and there is no earlier quote to serve.
+        """
+        ticker = ticker.strip().upper()
+        now = time.time()
+
+        with self._lock:
+            entry = self._quotes.get(ticker)
+            if entry is not None:
+                quote, fetched_at = entry
+                age = now - fetched_at
+                if quote is None and age < QUOTE_NEGATIVE_TTL_SECONDS:
+                    self.hits += 1
+                    return None
+                if quote is not None and age < self.ttl:
+                    self.hits += 1
+                    return quote
+                if quote is not None and age < self.ttl + self.stale:
+                    self.stale_hits += 1
+                    self._request(ticker)
+                    return quote
+
+            self.misses += 1
+            pending = self._request(ticker)
+
+        pending.done.wait(timeout)
+        if pending.quote is None and pending.error is not None:
+            raise pending.error
+        return pending.quote
+
+    def age(self, ticker):
+        """Seconds since the ticker's last good quote was fetched, or None if there is none."""
+        with self._lock:
+            entry = self._quotes.get(ticker.strip().upper())
+        if entry is None or entry[0] is None:
+            return None
+        return time.time() - entry[1]
+
+    def refresh(self, tickers):
+        """Queue tickers for the next batch fetch without waiting for it."""
+        with self._lock:
+            for ticker in tickers:
+                self._request(ticker.strip().upper())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "batches": self.batches,
+                "tickers_fetched": self.tickers_fetched,
+            }
+
+
+_quote_service = None
+_quote_service_lock = threading.Lock()
+
+
+def get_quote_service():
+    """Return the process-wide QuoteService."""
+    global _quote_service
+    if _quote_service is None:
+        with _quote_service_lock:
+            if _quote_service is None:
+                _quote_service = QuoteService()
+    return _quote_service
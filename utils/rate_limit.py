@@ -0,0 +1,196 @@
+import os
+import time
+import threading
+
+
+# SEC EDGAR fair-access policy: no more than 10 requests per second.
+SEC_MAX_REQUESTS_PER_SECOND = float(os.environ.get("SEC_MAX_REQUESTS_PER_SECOND", 10))
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket rate limiter.
+    Tokens refill continuously at `rate` per second up to `capacity`; acquire()
+    blocks the calling thread until a token is available.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate, capacity=None):
+        """Change the refill rate (and capacity, which defaults to the new rate)."""
+        with self._lock:
+            self._refill()
+            self.rate = float(rate)
+            self.capacity = float(capacity if capacity is not None else rate)
+            self._tokens = min(self._tokens, self.capacity)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1, timeout=None):
+        """Block until `tokens` are available. Returns False if timeout expires first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+
+            time.sleep(wait)
+
+
+# Shared by every session in the process so the SEC limit holds globally.
+sec_rate_limiter = TokenBucket(SEC_MAX_REQUESTS_PER_SECOND)
+
+
+# Concurrency bounds per upstream: (initial, max). Limits grow by one slot per
+# window of successful calls and halve on every rate-limit response.
+UPSTREAM_LIMITS = {
+    "duckduckgo": (1, 4),
+    "yahoo": (2, 8),
+    "sec-edgar": (4, 10),
+    "sec-api": (4, 16),
+}
+
+RATE_LIMIT_BACKOFF_SECONDS = 1.0
+RATE_LIMIT_MAX_BACKOFF_SECONDS = 60.0
+
+
+class RateLimitedError(Exception):
+    """Raised by a call that was rejected by its upstream with a rate-limit response."""
+
+    def __init__(self, message="rate limited", retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_rate_limit_error(error):
+    """True for exceptions or messages that report an upstream rate limit."""
+    if isinstance(error, RateLimitedError):
+        return True
+    text = str(error).lower()
+    return "429" in text or "too many requests" in text or "ratelimit" in text or "rate limit" in text
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limiter for one upstream. Each success raises the limit
+    by 1/limit (one slot per window of successes); each rate-limit response
+    halves it and pauses new calls for an exponentially growing backoff.
+    Callers over the limit, or during a backoff, wait in acquire() instead
+    of failing.
+    """
+
+    def __init__(self, name, initial=2, max_limit=16, min_limit=1, decrease=0.5):
+        self.name = name
+        self.limit = float(initial)
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.decrease = decrease
+        self.in_flight = 0
+        self.waiting = 0
+        self.successes = 0
+        self.rate_limited = 0
+        self._backoff = RATE_LIMIT_BACKOFF_SECONDS
+        self._backoff_until = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            self.waiting += 1
+            while True:
+                pause = self._backoff_until - time.monotonic()
+                if pause <= 0 and self.in_flight < int(self.limit):
+                    break
+                self._condition.wait(pause if pause > 0 else None)
+            self.waiting -= 1
+            self.in_flight += 1
+
+    def release(self, outcome="ok", retry_after=None):
+        """outcome: "ok", "rate_limited", or "error" (neither grows nor shrinks the limit)."""
+        with self._condition:
+            self.in_flight -= 1
+            if outcome == "ok":
+                self.successes += 1
+                self.limit = min(self.limit + 1.0 / self.limit, self.max_limit)
+                self._backoff = RATE_LIMIT_BACKOFF_SECONDS
+            elif outcome == "rate_limited":
+                self.rate_limited += 1
+                if time.monotonic() < self._backoff_until:
+                    # Calls already in flight when the limit was cut: one decrease per episode
+                    self._condition.notify_all()
+                    return
+                self.limit = max(self.limit * self.decrease, self.min_limit)
+                pause = max(retry_after or 0, self._backoff)
+                self._backoff_until = max(self._backoff_until, time.monotonic() + pause)
+                self._backoff = min(self._backoff * 2, RATE_LIMIT_MAX_BACKOFF_SECONDS)
+            self._condition.notify_all()
+
+    def run(self, func, *args, max_attempts=4, **kwargs):
+        """
+        Call func under the limiter. Rate-limit errors (RateLimitedError or a
+        429/"ratelimit" exception) shrink the limit and the call is queued
+        again, up to max_attempts; other exceptions propagate unchanged.
+        """
+        for attempt in range(1, max_attempts + 1):
+            self.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if is_rate_limit_error(e):
+                    self.release("rate_limited", getattr(e, "retry_after", None))
+                    if attempt < max_attempts:
+                        continue
+                else:
+                    self.release("error")
+                raise
+            self.release("ok")
+            return result
+
+    def stats(self):
+        with self._condition:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "successes": self.successes,
+                "rate_limited": self.rate_limited,
+                "backoff_seconds": round(max(self._backoff_until - time.monotonic(), 0), 2),
+            }
+
+
+_upstream_limiters = {}
+_upstream_limiters_lock = threading.Lock()
+
+
+def get_upstream_limiter(name):
+    """Return the process-wide AdaptiveLimiter for an upstream in UPSTREAM_LIMITS."""
+    with _upstream_limiters_lock:
+        limiter = _upstream_limiters.get(name)
+        if limiter is None:
+            initial, max_limit = UPSTREAM_LIMITS.get(name, (2, 8))
+            limiter = _upstream_limiters[name] = AdaptiveLimiter(name, initial, max_limit)
+        return limiter
+
+
+def upstream_stats():
+    """Current limit, queue and backoff state of every upstream."""
+    with _upstream_limiters_lock:
+        limiters = list(_upstream_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
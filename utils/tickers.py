@@ -0,0 +1,287 @@
+import os
+import re
+import json
+import difflib
+import threading
+from collections import namedtuple, deque
+
+import logging
+copilot_logger = logging.getLogger("copilot")
+
+from utils.cache import CACHE_DIR
+
+
+# SEC's ticker/CIK mapping, downloaded from https://www.sec.gov/files/company_tickers.json
+COMPANY_TICKERS_PATH = os.environ.get(
+    "COMPANY_TICKERS_PATH", os.path.join(CACHE_DIR, "company_tickers.json")
+)
+
+# Colloquial names the SEC titles don't cover, and the short names users
+# type for the largest issuers ("Meta" for "Meta Platforms, Inc.")
+MANUAL_ALIASES = {
+    'APPLE': 'AAPL',
+    'MICROSOFT': 'MSFT',
+    'GOOGLE': 'GOOGL',
+    'ALPHABET': 'GOOGL',
+    'AMAZON': 'AMZN',
+    'TESLA': 'TSLA',
+    'META': 'META',
+    'FACEBOOK': 'META',
+    'NVIDIA': 'NVDA',
+    'BERKSHIRE': 'BRK',
+    'JPM': 'JPM',
+    'JP MORGAN': 'JPM',
+    'VISA': 'V',
+}
+
+# Used when company_tickers.json is not available locally
+DEFAULT_COMPANIES = {
+    'APPLE': 'AAPL',
+    'MICROSOFT': 'MSFT',
+    'ALPHABET': 'GOOGL',
+    'AMAZON': 'AMZN',
+    'TESLA': 'TSLA',
+    'META': 'META',
+    'NVIDIA': 'NVDA',
+    'JPM': 'JPM',
+    'VISA': 'V',
+}
+
+# Trailing words dropped from SEC titles to form the short alias ("Apple Inc." -> "APPLE")
+NAME_SUFFIXES = {
+    'INC', 'INCORPORATED', 'CORP', 'CORPORATION', 'CO', 'COMPANY', 'COS', 'LTD', 'LIMITED',
+    'PLC', 'LLC', 'LP', 'L', 'P', 'SA', 'NV', 'AG', 'SE', 'HOLDINGS', 'HOLDING', 'GROUP',
+    'COM', 'CLASS', 'A', 'B', 'C', 'DE', 'NEW', 'THE', 'TRUST', 'ETF',
+}
+
+# Single-word aliases that are also everyday words only match when capitalized in the query
+COMMON_WORDS = {
+    'TARGET', 'BLOCK', 'MATCH', 'GAP', 'BEST', 'GENERAL', 'UNITED', 'FIRST', 'AMERICAN', 'NATIONAL',
+    'CITIZENS', 'SOUTHERN', 'PROGRESSIVE', 'BALL', 'CORNING', 'ANSWER', 'REAL', 'NEWS', 'HOME',
+    'TRAVELERS', 'CARRIER', 'UNITY', 'SNAP', 'ZOOM', 'SHOPIFY', 'STATE', 'GLOBAL', 'ENERGY',
+}
+
+# Upper-case words in questions that are also tickers; they only match as $ticker
+COMMON_ACRONYMS = {
+    'A', 'I', 'AI', 'CEO', 'CFO', 'COO', 'EPS', 'ESG', 'ETF', 'FY', 'GDP', 'IPO', 'IT', 'KPI',
+    'Q', 'R', 'SEC', 'TTM', 'US', 'USA', 'USD', 'YOY',
+}
+
+# When two matches are equally long, a manual alias beats a ticker, which beats an SEC name
+SOURCE_RANK = {'alias': 2, 'ticker': 1, 'name': 0}
+
+_NAME_TOKEN_RE = re.compile(r"[A-Za-z0-9]+")
+_TICKER_TOKEN_RE = re.compile(r"(\$?)\b([A-Za-z]{1,5}(?:[.\-][A-Za-z]{1,2})?)\b")
+
+Resolution = namedtuple("Resolution", ["ticker", "cik", "name", "matched", "source"])
+
+
+def load_company_tickers(path):
+    """Read SEC's company_tickers.json into a list of (cik, ticker, title), in file order."""
+    with open(path, 'rb') as f:
+        data = json.load(f)
+    entries = data.values() if isinstance(data, dict) else data
+    return [(int(entry['cik_str']), entry['ticker'].upper(), entry['title']) for entry in entries]
+
+
+def normalize_name(name):
+    """Upper-case a company name into a tuple of word tokens."""
+    return tuple(token.upper() for token in _NAME_TOKEN_RE.findall(name))
+
+
+def short_name(tokens):
+    """Drop corporate suffixes and a leading 'THE' from a normalized name."""
+    tokens = list(tokens)
+    while tokens and tokens[-1] in NAME_SUFFIXES:
+        tokens.pop()
+    if tokens and tokens[0] == 'THE':
+        tokens.pop(0)
+    return tuple(tokens)
+
+
+class _TokenAutomaton:
+    """
+    Aho-Corasick automaton over word tokens. Scanning a query visits each
+    token once and reports every dictionary name ending there.
+    """
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [None]
+
+    def add(self, tokens, value):
+        node = 0
+        for token in tokens:
+            next_node = self._goto[node].get(token)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][token] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+            node = next_node
+        # The first name registered for a token sequence wins
+        if self._output[node] is None:
+            self._output[node] = (len(tokens), value)
+
+    def build(self):
+        # Breadth-first failure links; each node also inherits the longest
+        # output reachable through its failure chain.
+        self._dict_output = list(self._output)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for token, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(token, 0)
+                if self._dict_output[child] is None:
+                    self._dict_output[child] = self._dict_output[self._fail[child]]
+
+    def scan(self, tokens):
+        """Yield (end_index, length, value) for the longest name ending at each token."""
+        node = 0
+        for index, token in enumerate(tokens):
+            while node and token not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(token, 0)
+            output = self._dict_output[node]
+            if output is not None:
+                yield index, output[0], output[1]
+
+
+class TickerResolver:
+    """
+    Resolves company names, aliases and tickers mentioned in free text to a
+    ticker and CIK. Built once from SEC's company_tickers.json; lookups are a
+    single pass over the query tokens plus a hash lookup per ticker-like token.
+    """
+
+    def __init__(self, companies=None):
+        # companies: list of (cik, ticker, title), most important first
+        self._by_ticker = {}
+        self._automaton = _TokenAutomaton()
+        self._aliases = {}
+
+        for cik, ticker, title in companies or []:
+            self._by_ticker.setdefault(ticker, (cik, title))
+
+        for alias, ticker in MANUAL_ALIASES.items():
+            self._by_ticker.setdefault(ticker, (None, alias.title()))
+            self._register(normalize_name(alias), ticker, "alias")
+
+        for cik, ticker, title in companies or []:
+            # SEC titles can carry a state of incorporation: "WELLS FARGO & COMPANY/MN"
+            full = normalize_name(title.split('/')[0])
+            for tokens in (full, short_name(full)):
+                if tokens:
+                    self._register(tokens, ticker, "name")
+
+        if not companies:
+            for name, ticker in DEFAULT_COMPANIES.items():
+                self._by_ticker.setdefault(ticker, (None, name.title()))
+                self._register(normalize_name(name), ticker, "name")
+
+        self._automaton.build()
+
+        # First-letter buckets keep fuzzy matching cheap
+        self._fuzzy_buckets = {}
+        for alias in self._aliases:
+            self._fuzzy_buckets.setdefault(alias[0], []).append(alias)
+
+    def _register(self, tokens, ticker, source):
+        alias = " ".join(tokens)
+        if alias not in self._aliases:
+            self._aliases[alias] = ticker
+            self._automaton.add(tokens, (ticker, source))
+
+    def __len__(self):
+        return len(self._by_ticker)
+
+    def _resolution(self, ticker, matched, source):
+        cik, name = self._by_ticker.get(ticker, (None, ticker))
+        return Resolution(ticker, cik, name, matched, source)
+
+    def lookup_ticker(self, ticker):
+        """Exact ticker lookup ('BRK.B' and 'BRK-B' are equivalent); None if unknown."""
+        ticker = ticker.upper().replace('.', '-')
+        if ticker in self._by_ticker:
+            return self._resolution(ticker, ticker, "ticker")
+        return None
+
+    def resolve(self, query, fuzzy=False):
+        """Return the Resolution for the company a query is about, or None."""
+        matches = list(_NAME_TOKEN_RE.finditer(query))
+        words = [match.group() for match in matches]
+        tokens = [word.upper() for word in words]
+
+        # Candidates: (length in tokens, source rank, -position, ticker, matched, source).
+        # The longest match wins, then the higher-ranked source, then the earliest one.
+        candidates = []
+        for end, length, (ticker, source) in self._automaton.scan(tokens):
+            start = end - length + 1
+            if length == 1 and tokens[end] in COMMON_WORDS and not words[end][0].isupper():
+                continue
+            candidates.append((
+                length, SOURCE_RANK[source], -matches[start].start(), ticker,
+                " ".join(tokens[start:end + 1]), source
+            ))
+
+        for match in _TICKER_TOKEN_RE.finditer(query):
+            dollar, candidate = match.groups()
+            # Tickers must be written in upper case (or as $ticker) to avoid matching words
+            if dollar or (candidate.isupper() and candidate not in COMMON_ACRONYMS):
+                resolution = self.lookup_ticker(candidate)
+                if resolution is not None:
+                    candidates.append((
+                        1, SOURCE_RANK["ticker"], -match.start(), resolution.ticker,
+                        resolution.matched, "ticker"
+                    ))
+
+        if candidates:
+            _, _, _, ticker, matched, source = max(candidates)
+            return self._resolution(ticker, matched, source)
+
+        if fuzzy:
+            return self._fuzzy_resolve(tokens)
+
+        return None
+
+    def _fuzzy_resolve(self, tokens, cutoff=0.85):
+        # Try longer phrases first so "jp morgn chase" prefers the full name
+        for size in (3, 2, 1):
+            for start in range(len(tokens) - size + 1):
+                phrase = " ".join(tokens[start:start + size])
+                if len(phrase) < 4:
+                    continue
+                matches = difflib.get_close_matches(
+                    phrase, self._fuzzy_buckets.get(phrase[0], []), n=1, cutoff=cutoff
+                )
+                if matches:
+                    return self._resolution(self._aliases[matches[0]], matches[0], "fuzzy")
+        return None
+
+
+_ticker_resolver = None
+_ticker_resolver_lock = threading.Lock()
+
+
+def get_ticker_resolver():
+    """Return the process-wide TickerResolver, building it on first use."""
+    global _ticker_resolver
+    if _ticker_resolver is None:
+        with _ticker_resolver_lock:
+            if _ticker_resolver is None:
+                try:
+                    companies = load_company_tickers(COMPANY_TICKERS_PATH)
+                except (OSError, ValueError) as e:
+                    copilot_logger.error(
+                        f"Could not load {COMPANY_TICKERS_PATH} ({str(e)}); "
+                        f"falling back to the built-in company list."
+                    )
+                    companies = None
+                _ticker_resolver = TickerResolver(companies)
+    return _ticker_resolver
@@ -1,6 +1,4 @@
 import streamlit as st
-from sec_api import QueryApi, FullTextSearchApi
-import requests
 from bs4 import BeautifulSoup
 
 import logging
@@ -10,29 +8,26 @@ copilot_logger.setLevel(logging.ERROR)
 from langchain.agents import Tool
 from langchain.tools import tool
 
-from langchain_openai import ChatOpenAI
+from utils.llm import get_chat_model
 
 from langchain_core.runnables import RunnableParallel
 from langchain_core.output_parsers import StrOutputParser
 
-from langchain_community.tools import DuckDuckGoSearchRun
 from langchain.tools import tool
 
+from utils.news import get_news_cache, format_headlines
+
 @tool
 def robust_search_tool(query: str) -> str:
     """Search the web for information. Handles rate limiting gracefully."""
-    import time
-    import random
-    from datetime import datetime
-    
     try:
-        # Add delay to avoid rate limiting
-        time.sleep(random.uniform(1, 3))
-        
-        # Try DuckDuckGo search
-        ddg_search = DuckDuckGoSearchRun()
-        results = ddg_search.run(query)
-        return results
+        # DuckDuckGo news search behind a shared cache: rephrasings of the
+        # same query share results, and stale results are served while they
+        # refresh, so only a cold query waits on (or fails with) the upstream
+        headlines = get_news_cache().get(query)
+        if not headlines:
+            return f"No search results found for '{query}'."
+        return format_headlines(headlines)
         
     except Exception as e:
         error_msg = str(e).lower()
@@ -61,23 +56,81 @@ def robust_search_tool(query: str) -> str:
 
 from pydantic.v1 import BaseModel, Field
 
-import yfinance as yf
 
-from utils.prompts import prompt
+from utils.prompts import prompt, PROMPT_VERSION
+from utils.cache import (
+    get_filing_cache, get_metadata_cache, query_cache_key, get_answer_cache, answer_cache_key,
+    get_context_cache, normalize_question
+)
+from utils.rate_limit import sec_rate_limiter, get_upstream_limiter, is_rate_limit_error
+from utils.quotes import get_quote_service, QUOTE_TTL_SECONDS
+from utils.warmer import get_cache_warmer
+from utils.http import (
+    get_http_pool, PooledQueryApi, PooledFullTextSearchApi, SEC_USER_AGENT
+)
+from utils.xbrl import get_fact_store, filing_index_url
+from utils.prices import get_price_store, return_metrics, filing_window_returns
+from utils.tickers import get_ticker_resolver
+from utils.extraction import (
+    extract_metrics, stream_extract_metrics, stream_extract_statements,
+    extract_table_statement, match_statement_rows, statement_values,
+    merge_statements, parse_cell_value, detect_scale
+)
+
+import os
+import time
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, wait
+
+# "full" builds a BeautifulSoup tree per filing; "streaming" parses
+# incrementally with lxml and never holds the whole document in memory
+FILING_PARSE_MODE = os.environ.get("FILING_PARSE_MODE", "full")
+
+# Fall back to fuzzy company-name matching when no exact name or ticker is found
+TICKER_FUZZY_MATCHING = os.environ.get("TICKER_FUZZY_MATCHING", "false").lower() == "true"
+
+# Number of recent filings fetched and parsed per retriever call
+MAX_FILINGS_PER_QUERY = 4
+
+# Filings fetches are I/O bound and throttled by sec_rate_limiter
+filing_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="filing-fetch")
+
+# Metadata and full-text searches run side by side; kept apart from
+# filing_executor so searches never queue behind filing downloads
+search_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="sec-search")
+
+# Per-stage time budgets for retriever, in seconds from the start of the call.
+# A stage that misses its budget is dropped from the context, not awaited.
+RETRIEVER_METADATA_TIMEOUT = float(os.environ.get("RETRIEVER_METADATA_TIMEOUT", 15))
+RETRIEVER_FILINGS_TIMEOUT = float(os.environ.get("RETRIEVER_FILINGS_TIMEOUT", 45))
+RETRIEVER_FULL_TEXT_TIMEOUT = float(os.environ.get("RETRIEVER_FULL_TEXT_TIMEOUT", 20))
+
+# Price history analysis: the trailing period summarized, the recent 10-K/10-Q
+# filings it is aligned to, and the trading days compared around each filing
+PRICE_ANALYSIS_DAYS = 365
+PRICE_ANALYSIS_FILINGS = 4
+PRICE_ANALYSIS_WINDOW = 5
 
 ss = st.session_state
 
-# Cache for stock prices to avoid rate limiting
-if 'stock_price_cache' not in ss:
-    ss.stock_price_cache = {}
-    ss.stock_price_cache_time = {}
+def get_configurations():
+    """
+    API keys for the current Streamlit session. Outside a Streamlit session
+    (batch runs, scripts) session state is unavailable and the keys are read
+    from the OPENAI_API_KEY and SEC_API_KEY environment variables.
+    """
+    try:
+        return ss["configurations"]
+    except KeyError:
+        return {
+            "openai_api_key": os.environ.get("OPENAI_API_KEY"),
+            "sec_api_key": os.environ.get("SEC_API_KEY")
+        }
+
 
 def get_openai_model():
-    """Get initialized OpenAI model with API key from session state."""
-    return ChatOpenAI(
-        model="gpt-3.5-turbo-16k", 
-        openai_api_key=ss.configurations["openai_api_key"]
-    )
+    """Get the shared OpenAI model for the API key in session state."""
+    return get_chat_model(get_configurations()["openai_api_key"])
 
 
 class CurrentStockPriceInput(BaseModel):
@@ -90,85 +143,16 @@ class CurrentStockPriceInput(BaseModel):
 @tool(args_schema=CurrentStockPriceInput)
 def get_current_stock_price(ticker: str) -> str:
     """Call this function with only a company's ticker symbol, to get the current stock price for the company."""
-    import time
-    import random
-    from datetime import datetime, timedelta
-    
     try:
         # Clean up the ticker symbol
         ticker = ticker.strip().upper()
+        get_cache_warmer().record_quote(ticker)
         
-        # Initialize cache if not exists (handle session state issues)
-        try:
-            if 'stock_price_cache' not in ss:
-                ss.stock_price_cache = {}
-                ss.stock_price_cache_time = {}
-                
-            # Check cache first (cache for 5 minutes)
-            if ticker in ss.stock_price_cache:
-                cache_time = ss.stock_price_cache_time.get(ticker, datetime.min)
-                if datetime.now() - cache_time < timedelta(minutes=5):
-                    return ss.stock_price_cache[ticker]
-        except Exception:
-            # If session state fails, proceed without caching
-            pass
-        
-        # Add a small random delay to avoid rate limiting
-        time.sleep(random.uniform(0.5, 1.5))
-        
-        # Create ticker object
-        stock_info = yf.Ticker(ticker)
-        
-        # Get current price - try multiple methods with rate limit handling
-        current_price = None
-        company_name = ticker
-        
-        # Method 1: Try history for most recent price (most reliable)
-        try:
-            hist = stock_info.history(period="1d", interval="1d")
-            if not hist.empty:
-                current_price = hist['Close'].iloc[-1]
-        except Exception as e:
-            if "429" in str(e) or "Too Many Requests" in str(e):
-                rate_limit_msg = (
-                    f"Yahoo Finance is currently rate-limiting requests. "
-                    f"Please try again in a few minutes. For {ticker}, "
-                    f"you can check the price manually at "
-                    f"https://finance.yahoo.com/quote/{ticker}"
-                )
-                return rate_limit_msg
-        
-        # Method 2: Try basic info (if history fails)
-        if not current_price:
-            try:
-                basic_info = stock_info.basic_info
-                if basic_info and 'previousClose' in basic_info:
-                    current_price = basic_info['previousClose']
-                    company_name = basic_info.get('longName', ticker)
-            except Exception as e:
-                if "429" in str(e) or "Too Many Requests" in str(e):
-                    rate_limit_msg = (
-                        f"Yahoo Finance is currently rate-limiting requests. "
-                        f"Please try again in a few minutes. For {ticker}, "
-                        f"you can check the price manually at "
-                        f"https://finance.yahoo.com/quote/{ticker}"
-                    )
-                    return rate_limit_msg
+        # Shared, batched and cached across every session in the process
+        quote = get_quote_service().get_quote(ticker)
         
-        if current_price and current_price > 0:
-            result = (
-                f"The current price of {company_name} ({ticker}) is "
-                f"USD ${current_price:.2f}. Note: Data may be delayed "
-                f"by up to 20 minutes."
-            )
-            # Cache the result if session state is available
-            try:
-                ss.stock_price_cache[ticker] = result
-                ss.stock_price_cache_time[ticker] = datetime.now()
-            except Exception:
-                # If session state fails, proceed without caching
-                pass
-            return result
+        if quote is not None and quote.price > 0:
+            return format_quote(quote)
         else:
             return (
                 f"Unable to retrieve current price for {ticker}. "
@@ -183,7 +167,7 @@ def get_current_stock_price(ticker: str) -> str:
             
     except Exception as e:
         error_msg = str(e)
-        if "429" in error_msg or "Too Many Requests" in error_msg:
+        if is_rate_limit_error(e):
             return (
                 f"Yahoo Finance is currently rate-limiting requests. "
                 f"Please try again in a few minutes. For {ticker}, "
@@ -200,98 +184,224 @@ def get_current_stock_price(ticker: str) -> str:
             )
 
 
+class PriceHistoryInput(BaseModel):
+    ticker: str = Field(
+        ...,
+        description="The ticker symbol for the company whose price history is to be analyzed."
+    )
+
+
+def recent_filing_dates(ticker, limit=PRICE_ANALYSIS_FILINGS):
+    """
+    (filed date, form) of a company's latest 10-K/10-Q filings, oldest first.
+    The local XBRL facts store is consulted first; the SEC API only on a miss.
+    """
+    filings = get_fact_store().filing_dates(ticker)
+    if not filings:
+        sec_api_key = get_configurations()["sec_api_key"]
+        response = search_filings(
+            PooledQueryApi(api_key=sec_api_key), metadata_search_query(ticker, ticker)
+        )
+        filings = sorted(
+            (filing["filedAt"][:10], filing.get("formType", ""))
+            for filing in response.get("filings", []) if filing.get("filedAt")
+        )
+    return filings[-limit:]
+
+
+def format_price_analysis(ticker, metrics, windows, filings):
+    """Render price history metrics and filing-aligned returns for the agents."""
+    def pct(value):
+        return "n/a" if value != value else f"{value * 100:+.1f}%"
+
+    text = (
+        f"Price history for {ticker} from {metrics['start']} to {metrics['end']} "
+        f"({metrics['trading_days']} trading days):\n"
+        f"• Total return: {pct(metrics['total_return'])} "
+        f"(annualized {pct(metrics['annualized_return'])})\n"
+        f"• Annualized volatility: {metrics['annualized_volatility'] * 100:.1f}%\n"
+        f"• Maximum drawdown: {pct(metrics['max_drawdown'])} "
+        f"(peak {metrics['drawdown_peak']}, trough {metrics['drawdown_trough']})\n"
+    )
+
+    if len(windows):
+        forms = dict(filings)
+        text += (
+            f"\nPrice moves around recent filings ({PRICE_ANALYSIS_WINDOW} trading days "
+            f"before and after, and until the next filing):\n"
+        )
+        for filed, row in windows.iterrows():
+            filed = filed.date().isoformat()
+            text += (
+                f"• {forms.get(filed, 'Filing')} filed {filed}: "
+                f"{pct(row['pre_return'])} before, {pct(row['post_return'])} after, "
+                f"{pct(row['to_next_filing'])} until the next filing\n"
+            )
+    return text
+
+
+@tool(args_schema=PriceHistoryInput)
+def get_price_history_analysis(ticker: str) -> str:
+    """Call this function with only a company's ticker symbol, to get its stock price performance over the past year (returns, volatility, drawdown) and how the price moved around its recent 10-K and 10-Q filings."""
+    try:
+        ticker = ticker.strip().upper()
+
+        # Served from the local Parquet store; only missing dates are downloaded
+        history = get_price_store().history(ticker)
+        close = history["close"].dropna()
+        since = (date.today() - timedelta(days=PRICE_ANALYSIS_DAYS)).isoformat()
+        metrics = return_metrics(close.loc[since:])
+        if metrics is None:
+            return (
+                f"Unable to retrieve price history for {ticker}. "
+                f"Please verify the ticker symbol or try again later."
+            )
+
+        try:
+            filings = recent_filing_dates(ticker)
+        except Exception as e:
+            copilot_logger.error(f"Filing dates lookup failed for {ticker}: {str(e)}")
+            filings = []
+        windows = filing_window_returns(
+            close, [filed for filed, _ in filings], window=PRICE_ANALYSIS_WINDOW
+        )
+
+        return format_price_analysis(ticker, metrics, windows, filings)
+
+    except Exception as e:
+        error_msg = str(e)
+        if is_rate_limit_error(e):
+            return (
+                f"Yahoo Finance is currently rate-limiting requests. "
+                f"Please try again in a few minutes."
+            )
+        copilot_logger.error(f"Error analyzing price history for {ticker}: {error_msg}")
+        return (
+            f"An error occurred while analyzing the price history for {ticker}. "
+            f"Error: {error_msg[:100]}... Please try again later."
+        )
+
+
+def format_quote(quote):
+    """Render a Quote the way the agents expect the price tool to answer."""
+    change = ""
+    if quote.previous_close:
+        percent = (quote.price - quote.previous_close) / quote.previous_close * 100
+        change = f" ({percent:+.2f}% from the previous close)"
+    stale = ""
+    age = time.time() - quote.fetched_at
+    if age > QUOTE_TTL_SECONDS:
+        # Served from cache because a refresh is pending or failed
+        stale = f" This quote was last refreshed {int(age // 60)} minutes ago and may be out of date."
+    return (
+        f"The current price of {quote.ticker} is "
+        f"USD ${quote.price:.2f}{change}, as of {quote.as_of}. Note: Data may be delayed "
+        f"by up to 20 minutes.{stale}"
+    )
+
+
 def handle_sec_api_errors(error_message: str):
     """Handles errors that occur during call to SEC API endpoint."""
     copilot_logger.error(f"SEC API error: {error_message}")
     ss.error_message = "An error occurred while retrieving SEC filings."
 
 
-def parse_financial_statements(filing_url, ticker):
+def iter_filing_document(filing_url, chunk_size=64 * 1024):
+    """
+    Yield the raw HTML of an SEC filing in chunks, going through the on-disk
+    filing cache. Cached documents are served without touching the network;
+    entries older than the revalidation window are checked with a conditional
+    GET. Downloads are streamed and written to the cache as they arrive.
+    """
+    cache = get_filing_cache()
+    cached = cache.get(filing_url)
+
+    # Checked before anything is yielded, so a corrupt entry is fetched again
+    # instead of failing a parse halfway through
+    if cached is not None and not cached.is_intact():
+        copilot_logger.error(f"Corrupt filing cache entry for {filing_url}, discarding it.")
+        cache.delete(filing_url)
+        cached = None
+
+    if cached is not None and not cached.is_stale():
+        yield from cached.iter_content(chunk_size)
+        return
+
+    headers = {
+        'User-Agent': SEC_USER_AGENT,
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Accept-Language': 'en-US,en;q=0.5',
+        'DNT': '1',
+    }
+
+    if cached is not None:
+        if cached.etag:
+            headers['If-None-Match'] = cached.etag
+        if cached.last_modified:
+            headers['If-Modified-Since'] = cached.last_modified
+
+    # Pooled keep-alive connection; the shared token bucket keeps every
+    # attempt (including retries) within SEC's request rate, and the adaptive
+    # limiter backs off all downloads when EDGAR starts answering 429
+    with get_http_pool().stream(
+        "GET", filing_url, headers=headers, rate_limiter=sec_rate_limiter,
+        limiter=get_upstream_limiter("sec-edgar")
+    ) as response:
+        if cached is not None and response.status_code == 304:
+            cache.touch(filing_url)
+            yield from cached.iter_content(chunk_size)
+            return
+
+        response.raise_for_status()
+
+        writer = cache.writer(
+            filing_url,
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified')
+        )
+        for chunk in response.iter_bytes(chunk_size):
+            writer.write(chunk)
+            yield chunk
+        writer.commit()
+
+
+def fetch_filing_document(filing_url):
+    """Fetch the complete raw HTML of an SEC filing (see iter_filing_document)."""
+    return b"".join(iter_filing_document(filing_url))
+
+
+def parse_financial_statements(filing_url, ticker, streaming=None):
     """
     Parse financial statements from SEC filing URL.
     Extracts key financial metrics from 10-K and 10-Q filings.
+    In streaming mode the document is parsed incrementally as it downloads,
+    which keeps memory bounded on very large filings.
     """
-    import requests
-    import re
     from bs4 import BeautifulSoup
-    import time
-    
+
+    if streaming is None:
+        streaming = FILING_PARSE_MODE == "streaming"
+
     try:
-        headers = {
-            'User-Agent': 'SEC Financial Parser 1.0 (research@example.com)',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.5',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-        }
-        
-        # Add delay to be respectful to SEC servers
-        time.sleep(2)
-        
-        response = requests.get(filing_url, headers=headers, timeout=15)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
+        if streaming:
+            financial_data, stats = stream_extract_metrics(iter_filing_document(filing_url))
+            # Aggregated over recent parses by utils.extraction.streaming_parse_stats()
+            rss_growth = (
+                f"{stats.rss_growth_bytes / 2**20:,.1f} MB" if stats.rss_growth_bytes is not None else "unknown"
+            )
+            copilot_logger.debug(
+                f"Streamed {stats.bytes_read / 2**20:,.1f} MB filing for {ticker} in {stats.seconds:.2f}s "
+                f"({stats.bytes_read / 2**20 / max(stats.seconds, 1e-9):,.1f} MB/s, RSS growth {rss_growth})"
+            )
+            return financial_data
+
+        content = fetch_filing_document(filing_url)
+
+        soup = BeautifulSoup(content, 'html.parser')
         text_content = soup.get_text()
         
-        # Financial data patterns
-        financial_data = {}
-        
-        # Revenue patterns
-        revenue_patterns = [
-            r'Net sales[\s\$]*(\d{1,3}(?:,\d{3})*)',
-            r'Total net sales[\s\$]*(\d{1,3}(?:,\d{3})*)',
-            r'Revenue[\s\$]*(\d{1,3}(?:,\d{3})*)',
-            r'Total revenue[\s\$]*(\d{1,3}(?:,\d{3})*)',
-        ]
-        
-        for pattern in revenue_patterns:
-            matches = re.findall(pattern, text_content, re.IGNORECASE)
-            if matches:
-                amounts = [int(match.replace(',', '')) for match in matches]
-                if amounts:
-                    financial_data['revenue_millions'] = max(amounts)
-                    break
-        
-        # Net income patterns
-        income_patterns = [
-            r'Net income[\s\$]*(\d{1,3}(?:,\d{3})*)',
-            r'Net earnings[\s\$]*(\d{1,3}(?:,\d{3})*)',
-        ]
-        
-        for pattern in income_patterns:
-            matches = re.findall(pattern, text_content, re.IGNORECASE)
-            if matches:
-                amounts = [int(match.replace(',', '')) for match in matches]
-                if amounts:
-                    financial_data['net_income_millions'] = max(amounts)
-                    break
-        
-        # Total assets pattern
-        assets_patterns = [
-            r'Total assets[\s\$]*(\d{1,3}(?:,\d{3})*)',
-        ]
-        
-        for pattern in assets_patterns:
-            matches = re.findall(pattern, text_content, re.IGNORECASE)
-            if matches:
-                amounts = [int(match.replace(',', '')) for match in matches]
-                if amounts:
-                    financial_data['total_assets_millions'] = max(amounts)
-                    break
-        
-        # Cash and equivalents
-        cash_patterns = [
-            r'Cash and cash equivalents[\s\$]*(\d{1,3}(?:,\d{3})*)',
-        ]
-        
-        for pattern in cash_patterns:
-            matches = re.findall(pattern, text_content, re.IGNORECASE)
-            if matches:
-                amounts = [int(match.replace(',', '')) for match in matches]
-                if amounts:
-                    financial_data['cash_millions'] = max(amounts)
-                    break
+        # Single pass over the text for every metric label
+        financial_data = extract_metrics(text_content)
         
         return financial_data
         
@@ -300,12 +410,103 @@ def parse_financial_statements(filing_url, ticker):
         return {}
 
 
+def get_filing_summary_from_facts(ticker, form_type="10-K"):
+    """Filing summary in the shape of get_financial_data_from_sec_api, from the local XBRL store."""
+    try:
+        store = get_fact_store()
+        fact = store.latest_filing(ticker, form_type)
+        if fact is None:
+            return {}
+
+        filing_url = filing_index_url(fact['cik'], fact['accn'])
+        return {
+            'company_name': fact['entity_name'] or 'Unknown',
+            'ticker': ticker,
+            'form_type': fact['form'],
+            'filing_date': fact['filed'] or 'Unknown',
+            'period_end': fact['end'] or 'Unknown',
+            'fiscal_year': fact['fy'] or 'Unknown',
+            'fiscal_quarter': fact['fp'] or 'Unknown',
+            'filing_url': filing_url,
+            'html_url': filing_url,
+            'document_description': 'XBRL company facts (local store)'
+        }
+
+    except Exception as e:
+        copilot_logger.error(f"Error reading local XBRL facts for {ticker}: {str(e)}")
+        return {}
+
+
+def build_facts_context(ticker):
+    """
+    Build retriever context from the local XBRL facts store: the latest annual
+    and quarterly values of the key metrics. Returns None on a miss.
+    """
+    try:
+        store = get_fact_store()
+        if not store.has_company(ticker):
+            return None
+
+        annual = store.latest_values(ticker, "annual")
+        quarterly = store.latest_values(ticker, "quarterly")
+
+        sections = []
+        for latest, title in [(annual, "Latest Annual Figures"), (quarterly, "Latest Quarterly Figures")]:
+            if not latest:
+                continue
+            section = f"{title}:\n"
+            for metric, fact in latest.items():
+                section += (
+                    f"• {metric.replace('_', ' ').title()}: {format_amount(fact['value'], 1)} "
+                    f"({fact['form']} {fact['fp']} {fact['fy']}, period ended {fact['end']}, "
+                    f"filed {fact['filed']})\n"
+                )
+            sections.append(section)
+
+        if not sections:
+            return None
+
+        any_fact = next(iter((annual or quarterly).values()))
+        company = any_fact['entity_name'] or ticker
+        filing_url = filing_index_url(any_fact['cik'], any_fact['accn'])
+
+        return (
+            f"\nSEC XBRL Financial Data (local company facts store):\n"
+            f"Company: {company}\nTicker: {ticker}\n\n"
+            + "\n".join(sections)
+            + f"\n📄 Filing URL: {filing_url}\n"
+        )
+
+    except Exception as e:
+        copilot_logger.error(f"Error building XBRL context for {ticker}: {str(e)}")
+        return None
+
+
+def search_filings(queryApi, search_query):
+    """
+    Run a QueryApi search through the shared metadata cache. Identical
+    searches from any session within the TTL are answered from memory, and
+    concurrent identical searches share a single upstream call.
+    """
+    cache = get_metadata_cache()
+    response = cache.get_or_load(
+        query_cache_key(search_query), lambda: queryApi.get_filings(search_query)
+    )
+    copilot_logger.debug(f"SEC metadata cache: {cache.stats()}")
+    return response
+
+
 def get_financial_data_from_sec_api(queryApi, ticker, form_type="10-K"):
     """
     Use SEC API to get more detailed financial information.
     This approach uses the SEC API's structured data capabilities.
+    The local XBRL facts store is consulted first; the API is only called on a miss.
     """
     try:
+        local_summary = get_filing_summary_from_facts(ticker, form_type)
+        if local_summary:
+            return local_summary
+
         # Search for specific financial data sections
         search_query = {
             "query": f'ticker:{ticker} AND formType:"{form_type}"',
@@ -314,7 +515,7 @@ def get_financial_data_from_sec_api(queryApi, ticker, form_type="10-K"):
             "sort": [{"filedAt": {"order": "desc"}}]
         }
         
-        response = queryApi.get_filings(search_query)
+        response = search_filings(queryApi, search_query)
         
         if response.get("filings"):
             filing = response["filings"][0]
@@ -340,289 +541,348 @@ def get_financial_data_from_sec_api(queryApi, ticker, form_type="10-K"):
         return {}
 
 
+def table_rows(table):
+    """Convert a BeautifulSoup <table> into a list of rows of cell strings."""
+    return [
+        [cell.get_text(" ", strip=True) for cell in row.find_all(['td', 'th'])]
+        for row in table.find_all('tr')
+    ]
+
+
+def extract_financial_statements(soup):
+    """
+    Classify every table in a filing once and extract income statement,
+    balance sheet and cash flow values in a single traversal.
+    Returns {statement: {'scale': multiplier or None, 'values': {field: value}}}.
+    """
+    statements = {}
+
+    for table in soup.find_all('table'):
+        statement, extracted = extract_table_statement(table_rows(table))
+        if statement is None:
+            continue
+
+        if extracted['scale'] is None:
+            # "(In millions, except per share amounts)" often sits just above the table
+            preceding = table.find_all_previous(string=True, limit=20)
+            extracted['scale'] = detect_scale(" ".join(reversed(preceding)))
+
+        merge_statements(statements, statement, extracted)
+
+    return statements
+
+
 def extract_income_statement_data(table):
     """Extract revenue, expenses, and net income from income statement table."""
-    data = {}
-    
-    try:
-        rows = table.find_all('tr')
-        
-        for row in rows:
-            cells = row.find_all(['td', 'th'])
-            if len(cells) >= 2:
-                row_text = cells[0].get_text(strip=True).upper()
-                
-                # Look for revenue patterns
-                if any(keyword in row_text for keyword in ['TOTAL REVENUE', 'NET SALES', 'REVENUE', 'TOTAL NET SALES']):
-                    values = extract_financial_values(cells[1:])
-                    if values:
-                        data['revenue'] = values[0]
-                
-                # Look for net income patterns
-                if any(keyword in row_text for keyword in ['NET INCOME', 'NET EARNINGS', 'NET LOSS']):
-                    values = extract_financial_values(cells[1:])
-                    if values:
-                        data['net_income'] = values[0]
-                
-                # Look for gross profit
-                if any(keyword in row_text for keyword in ['GROSS PROFIT', 'GROSS INCOME']):
-                    values = extract_financial_values(cells[1:])
-                    if values:
-                        data['gross_profit'] = values[0]
-                
-                # Look for operating expenses
-                if any(keyword in row_text for keyword in ['OPERATING EXPENSES', 'TOTAL OPERATING EXPENSES']):
-                    values = extract_financial_values(cells[1:])
-                    if values:
-                        data['operating_expenses'] = values[0]
-    
-    except Exception as e:
-        copilot_logger.error(f"Error extracting income statement data: {str(e)}")
-    
-    return data
+    return statement_values(match_statement_rows(table_rows(table))['income_statement'])
 
 
 def extract_balance_sheet_data(table):
     """Extract assets, liabilities, and equity from balance sheet table."""
-    data = {}
-    
-    try:
-        rows = table.find_all('tr')
-        
-        for row in rows:
-            cells = row.find_all(['td', 'th'])
-            if len(cells) >= 2:
-                row_text = cells[0].get_text(strip=True).upper()
-                
-                # Look for total assets
-                if any(keyword in row_text for keyword in ['TOTAL ASSETS', 'TOTAL CURRENT ASSETS']):
-                    values = extract_financial_values(cells[1:])
-                    if values:
-                        data['total_assets'] = values[0]
-                
-                # Look for total liabilities
-                if any(keyword in row_text for keyword in ['TOTAL LIABILITIES', 'TOTAL CURRENT LIABILITIES']):
-                    values = extract_financial_values(cells[1:])
-                    if values:
-                        data['total_liabilities'] = values[0]
-                
-                # Look for shareholders' equity
-                if any(keyword in row_text for keyword in ['STOCKHOLDERS EQUITY', 'SHAREHOLDERS EQUITY', 'TOTAL EQUITY']):
-                    values = extract_financial_values(cells[1:])
-                    if values:
-                        data['stockholders_equity'] = values[0]
-                
-                # Look for cash and equivalents
-                if any(keyword in row_text for keyword in ['CASH AND CASH EQUIVALENTS', 'CASH AND EQUIVALENTS']):
-                    values = extract_financial_values(cells[1:])
-                    if values:
-                        data['cash_and_equivalents'] = values[0]
-    
-    except Exception as e:
-        copilot_logger.error(f"Error extracting balance sheet data: {str(e)}")
-    
-    return data
+    return statement_values(match_statement_rows(table_rows(table))['balance_sheet'])
 
 
 def extract_cash_flow_data(table):
     """Extract cash flow data from cash flow statement table."""
-    data = {}
-    
-    try:
-        rows = table.find_all('tr')
-        
-        for row in rows:
-            cells = row.find_all(['td', 'th'])
-            if len(cells) >= 2:
-                row_text = cells[0].get_text(strip=True).upper()
-                
-                # Look for operating cash flow
-                if any(keyword in row_text for keyword in ['NET CASH PROVIDED BY OPERATING', 'CASH FROM OPERATING']):
-                    values = extract_financial_values(cells[1:])
-                    if values:
-                        data['operating_cash_flow'] = values[0]
-                
-                # Look for investing cash flow
-                if any(keyword in row_text for keyword in ['NET CASH USED IN INVESTING', 'CASH FROM INVESTING']):
-                    values = extract_financial_values(cells[1:])
-                    if values:
-                        data['investing_cash_flow'] = values[0]
-                
-                # Look for financing cash flow
-                if any(keyword in row_text for keyword in ['NET CASH PROVIDED BY FINANCING', 'CASH FROM FINANCING']):
-                    values = extract_financial_values(cells[1:])
-                    if values:
-                        data['financing_cash_flow'] = values[0]
-    
-    except Exception as e:
-        copilot_logger.error(f"Error extracting cash flow data: {str(e)}")
-    
-    return data
+    return statement_values(match_statement_rows(table_rows(table))['cash_flow'])
 
 
 def extract_financial_values(cells):
     """Extract financial values from table cells, handling various formats."""
-    import re
-    
     values = []
     
     for cell in cells:
-        cell_text = cell.get_text(strip=True)
-        
-        # Remove common formatting characters
-        clean_text = re.sub(r'[,$\s]', '', cell_text)
-        
-        # Look for numbers (including negative numbers in parentheses)
-        number_match = re.search(r'^\(?(\d+(?:\.\d+)?)\)?$', clean_text)
-        if number_match:
-            value = float(number_match.group(1))
-            # Handle negative numbers in parentheses
-            if cell_text.strip().startswith('(') and cell_text.strip().endswith(')'):
-                value = -value
+        value = parse_cell_value(cell.get_text(strip=True))
+        if value is not None:
             values.append(value)
     
     return values
 
 
-def retriever(query):
+def parse_financial_tables(filing_url, ticker, streaming=None):
     """
-    Retrieves SEC filings using SEC-API and processes them to answer questions.
-    Uses both filing metadata and full-text search for comprehensive results.
-    Now includes financial statement parsing for detailed data extraction.
+    Extract structured financial statements from the tables of an SEC filing
+    document. Returns {} if no statement tables were recognized.
     """
+    from bs4 import BeautifulSoup
+
+    if streaming is None:
+        streaming = FILING_PARSE_MODE == "streaming"
+
     try:
-        # Initialize SEC API clients
-        queryApi = QueryApi(api_key=ss.configurations["sec_api_key"])
-        fullTextApi = FullTextSearchApi(api_key=ss.configurations["sec_api_key"])
-        
-        # Extract company ticker or name from query if possible
-        # This is a simple approach - could be enhanced with NLP
-        query_upper = query.upper()
-        possible_ticker = None
-        
-        # Company name to ticker mapping for better detection
-        company_mappings = {
-            'APPLE': 'AAPL',
-            'MICROSOFT': 'MSFT', 
-            'GOOGLE': 'GOOGL',
-            'ALPHABET': 'GOOGL',
-            'AMAZON': 'AMZN',
-            'TESLA': 'TSLA',
-            'META': 'META',
-            'FACEBOOK': 'META',
-            'NVIDIA': 'NVDA',
-            'BERKSHIRE': 'BRK',
-            'JPM': 'JPM',
-            'JP MORGAN': 'JPM',
-            'VISA': 'V'
-        }
-        
-        # First check for company names
-        for company_name, ticker in company_mappings.items():
-            if company_name in query_upper:
-                possible_ticker = ticker
-                break
-        
-        # If no company name found, check for direct ticker matches
-        if not possible_ticker:
-            tickers = ['AAPL', 'MSFT', 'GOOGL', 'AMZN', 'TSLA', 'META', 'NVDA', 'BRK', 'JPM', 'V']
-            for ticker in tickers:
-                # Use word boundaries to avoid partial matches
-                import re
-                if re.search(r'\b' + ticker + r'\b', query_upper):
-                    possible_ticker = ticker
-                    break
-        
-        texts = []
-        
-        # Search 1: Filing metadata search
-        if possible_ticker:
-            search_query = {
-                "query": f'ticker:{possible_ticker} AND formType:("10-K" OR "10-Q")',
-                "from": "0",
-                "size": "5",
-                "sort": [{"filedAt": {"order": "desc"}}]
-            }
-        else:
-            # Generic search if no ticker identified
-            search_query = {
-                "query": f'formType:("10-K" OR "10-Q") AND companyName:{query}',
-                "from": "0", 
-                "size": "5",
-                "sort": [{"filedAt": {"order": "desc"}}]
-            }
-        
-        # Get filings metadata
-        response = queryApi.get_filings(search_query)
-        
-        if response.get("filings"):
-            for filing in response["filings"][:2]:  # Limit to 2 recent filings
-                filing_info = f"""
-                SEC Filing Found:
-                Company: {filing.get('companyName', 'Unknown')}
-                Ticker: {filing.get('ticker', 'N/A')}
-                Form Type: {filing.get('formType', 'Unknown')}
-                Filed: {filing.get('filedAt', 'Unknown')[:10]}
-                Period End: {filing.get('periodOfReport', 'Unknown')}
-                📄 Filing URL: {filing.get('linkToFilingDetails', 'Not available')}
-                """
-                
-                # Parse financial statements from the filing
-                filing_url = filing.get('linkToFilingDetails')
-                ticker_symbol = filing.get('ticker', possible_ticker)
-                
-                if filing_url and ticker_symbol:
-                    financial_data = parse_financial_statements(filing_url, ticker_symbol)
-                    
-                    if financial_data:
-                        filing_info += "\n=== EXTRACTED FINANCIAL DATA ===\n"
-                        for key, value in financial_data.items():
-                            if isinstance(value, (int, float)) and 'millions' in key:
-                                # Format as millions/billions with better spacing
-                                if value >= 1000:
-                                    billions = value / 1000
-                                    filing_info += f"• {key.replace('_millions', '').replace('_', ' ').title()}: ${billions:,.1f} billion\n"
-                                else:
-                                    filing_info += f"• {key.replace('_millions', '').replace('_', ' ').title()}: ${value:,.0f} million\n"
-                            else:
-                                filing_info += f"• {key.replace('_', ' ').title()}: {value}\n"
-                        filing_info += f"\n📄 Source: {filing.get('linkToFilingDetails', 'URL not available')}\n"
-                        filing_info += "=== END FINANCIAL DATA ===\n"
+        if streaming:
+            return stream_extract_statements(iter_filing_document(filing_url))
+
+        soup = BeautifulSoup(fetch_filing_document(filing_url), 'lxml')
+        return extract_financial_statements(soup)
+
+    except Exception as e:
+        copilot_logger.error(f"Error extracting financial tables for {ticker}: {str(e)}")
+        return {}
+
+
+def primary_document_url(filing):
+    """
+    URL of the main filing document (the 10-K or 10-Q itself), falling back to
+    the filing index page when the document list is unavailable.
+    """
+    form_type = filing.get('formType')
+    for document in filing.get('documentFormatFiles') or []:
+        url = document.get('documentUrl', '')
+        if document.get('type') == form_type and url.lower().endswith(('.htm', '.html')):
+            # Inline XBRL viewer links wrap the raw document path
+            return url.replace('/ix?doc=', '')
+    return filing.get('linkToFilingDetails')
+
+
+STATEMENT_TITLES = {
+    'income_statement': 'Income Statement',
+    'balance_sheet': 'Balance Sheet',
+    'cash_flow': 'Cash Flow Statement',
+}
+
+
+def format_amount(value, scale):
+    """Format a reported table value as dollars, e.g. '$394.3 billion'."""
+    if scale is None:
+        return f"{value:,.0f} (units not stated)"
+
+    dollars = abs(value * scale)
+    sign = "-" if value < 0 else ""
+    if dollars >= 1_000_000_000:
+        return f"{sign}${dollars / 1_000_000_000:,.1f} billion"
+    if dollars >= 1_000_000:
+        return f"{sign}${dollars / 1_000_000:,.1f} million"
+    return f"{sign}${dollars:,.0f}"
+
+
+def format_financial_statements(statements):
+    """Render extracted statements as compact bullet lists for the LLM context."""
+    text = "\n=== EXTRACTED FINANCIAL STATEMENTS ===\n"
+    for statement, title in STATEMENT_TITLES.items():
+        if statement not in statements:
+            continue
+        text += f"{title}:\n"
+        scale = statements[statement]['scale']
+        for field, value in statements[statement]['values'].items():
+            text += f"• {field.replace('_', ' ').title()}: {format_amount(value, scale)}\n"
+    return text
+
+
+def build_filing_context(filing, possible_ticker):
+    """Build the context block for one filing, including parsed financial data."""
+    filing_info = f"""
+    SEC Filing Found:
+    Company: {filing.get('companyName', 'Unknown')}
+    Ticker: {filing.get('ticker', 'N/A')}
+    Form Type: {filing.get('formType', 'Unknown')}
+    Filed: {filing.get('filedAt', 'Unknown')[:10]}
+    Period End: {filing.get('periodOfReport', 'Unknown')}
+    📄 Filing URL: {filing.get('linkToFilingDetails', 'Not available')}
+    """
+    
+    # Parse financial statements from the filing document
+    document_url = primary_document_url(filing)
+    ticker_symbol = filing.get('ticker', possible_ticker)
+    
+    if document_url and ticker_symbol:
+        # Primary path: structured rows from the statement tables
+        statements = parse_financial_tables(document_url, ticker_symbol)
+        
+        if statements:
+            filing_info += format_financial_statements(statements)
+            filing_info += f"\n📄 Source: {filing.get('linkToFilingDetails', 'URL not available')}\n"
+            filing_info += "=== END FINANCIAL STATEMENTS ===\n"
+            return filing_info
+        
+        # Fallback: label/amount matches over the flattened text
+        financial_data = parse_financial_statements(document_url, ticker_symbol)
+        
+        if financial_data:
+            filing_info += "\n=== EXTRACTED FINANCIAL DATA ===\n"
+            for key, value in financial_data.items():
+                if isinstance(value, (int, float)) and 'millions' in key:
+                    # Format as millions/billions with better spacing
+                    if value >= 1000:
+                        billions = value / 1000
+                        filing_info += f"• {key.replace('_millions', '').replace('_', ' ').title()}: ${billions:,.1f} billion\n"
                     else:
-                        filing_info += f"""
-                        
-                This {filing.get('formType', 'Unknown')} filing contains comprehensive financial information.
-                Financial statement parsing was attempted but no data was extracted.
-                You can access the complete filing at: {filing.get('linkToFilingDetails', 'URL not available')}
-                        """
-                
-                texts.append(filing_info)
-        
-        # Search 2: Full-text search for more detailed content
-        try:
-            full_text_query = {
-                "query": f'"{query}"',
-                "formTypes": ["10-K", "10-Q"],
-                "startDate": "2022-01-01",  # Last 2 years
-                "endDate": "2024-12-31"
-            }
-            
-            full_text_response = fullTextApi.get_filings(full_text_query)
+                        filing_info += f"• {key.replace('_millions', '').replace('_', ' ').title()}: ${value:,.0f} million\n"
+                else:
+                    filing_info += f"• {key.replace('_', ' ').title()}: {value}\n"
+            filing_info += f"\n📄 Source: {filing.get('linkToFilingDetails', 'URL not available')}\n"
+            filing_info += "=== END FINANCIAL DATA ===\n"
+        else:
+            filing_info += f"""
             
-            if full_text_response.get("filings"):
-                for filing in full_text_response["filings"][:2]:  # Add 2 more
-                    filing_info = f"""
+    This {filing.get('formType', 'Unknown')} filing contains comprehensive financial information.
+    Financial statement parsing was attempted but no data was extracted.
+    You can access the complete filing at: {filing.get('linkToFilingDetails', 'URL not available')}
+            """
+    
+    return filing_info
+
+
+def metadata_search_query(query, possible_ticker):
+    """Build the QueryApi search for the latest 10-K/10-Q filings a query is about."""
+    if possible_ticker:
+        return {
+            "query": f'ticker:{possible_ticker} AND formType:("10-K" OR "10-Q")',
+            "from": "0",
+            "size": "5",
+            "sort": [{"filedAt": {"order": "desc"}}]
+        }
+    # Generic search if no ticker identified
+    return {
+        "query": f'formType:("10-K" OR "10-Q") AND companyName:{query}',
+        "from": "0", 
+        "size": "5",
+        "sort": [{"filedAt": {"order": "desc"}}]
+    }
+
+
+def full_text_contexts(fullTextApi, query):
+    """Run the full-text search for a query and format the top matches."""
+    full_text_query = {
+        "query": f'"{query}"',
+        "formTypes": ["10-K", "10-Q"],
+        "startDate": "2022-01-01",  # Last 2 years
+        "endDate": "2024-12-31"
+    }
+    
+    full_text_response = fullTextApi.get_filings(full_text_query)
+    
+    texts = []
+    for filing in full_text_response.get("filings", [])[:2]:  # Add 2 more
+        texts.append(f"""
                     Full-text Match:
                     Company: {filing.get('companyName', 'Unknown')}
                     Form: {filing.get('formType', 'Unknown')}
                     Filed: {filing.get('filedAt', 'Unknown')[:10]}
                     Relevance: High text match for "{query}"
-                    """
-                    texts.append(filing_info)
+                    """)
+    return texts
+
+
+def _remaining(started, budget):
+    return max(budget - (time.perf_counter() - started), 0)
+
+
+def assemble_context(query, sec_api_key):
+    """
+    Build the SEC filing context for a query. Returns (texts, complete),
+    where complete is False when a stage timed out or failed, so a partial
+    context is not cached.
+
+    The searches run as concurrent stages: full-text search starts right away,
+    the metadata search runs alongside it, and each filing is fetched as soon
+    as the metadata search returns. Every stage has its own time budget; a
+    stage that runs over is left out of the context rather than awaited.
+    """
+    # SEC API clients share the process-wide keep-alive connection pool
+    queryApi = PooledQueryApi(api_key=sec_api_key)
+    fullTextApi = PooledFullTextSearchApi(api_key=sec_api_key)
+    
+    started = time.perf_counter()
+    timings = {}
+    complete = True
+    
+    # Full-text search depends on nothing else, start it first
+    full_text_future = search_executor.submit(full_text_contexts, fullTextApi, query)
+    
+    # Resolve the company the query is about (names, aliases and tickers)
+    resolution = get_ticker_resolver().resolve(query, fuzzy=TICKER_FUZZY_MATCHING)
+    possible_ticker = resolution.ticker if resolution else None
+    
+    texts = []
+    
+    # Search 0: local XBRL company facts store, no network needed on a hit
+    facts_context = build_facts_context(possible_ticker) if possible_ticker else None
+    if facts_context:
+        texts.append(facts_context)
+    
+    # Search 1: Filing metadata search, only on a local store miss
+    if not facts_context:
+        search_query = metadata_search_query(query, possible_ticker)
+        metadata_future = search_executor.submit(search_filings, queryApi, search_query)
         
+        try:
+            response = metadata_future.result(
+                timeout=_remaining(started, RETRIEVER_METADATA_TIMEOUT)
+            )
+        except FuturesTimeoutError:
+            copilot_logger.error("Filing metadata search timed out, continuing without filings.")
+            response = {}
+            complete = False
         except Exception as e:
-            # If full-text search fails, continue with metadata search only
-            copilot_logger.info(f"Full-text search failed: {str(e)}")
+            # The full-text stage is already running; its result is still used
+            copilot_logger.error(f"Filing metadata search failed, continuing without filings: {str(e)}")
+            response = {}
+            complete = False
+        timings["metadata"] = time.perf_counter() - started
+        
+        # Fetch and parse the filings concurrently, keeping their order
+        filing_futures = [
+            filing_executor.submit(build_filing_context, filing, possible_ticker)
+            for filing in response.get("filings", [])[:MAX_FILINGS_PER_QUERY]
+        ]
+        wait(filing_futures, timeout=_remaining(started, RETRIEVER_FILINGS_TIMEOUT))
+        
+        for future in filing_futures:
+            if not future.done():
+                # Left running: the download still lands in the filing cache
+                copilot_logger.error("Filing fetch timed out, leaving it out of the context.")
+                complete = False
+            elif future.exception() is not None:
+                copilot_logger.error(f"Filing fetch failed: {str(future.exception())}")
+                complete = False
+            else:
+                texts.append(future.result())
+        timings["filings"] = time.perf_counter() - started
+    
+    # Search 2: Full-text search for more detailed content
+    try:
+        texts.extend(full_text_future.result(
+            timeout=_remaining(started, RETRIEVER_FULL_TEXT_TIMEOUT)
+        ))
+    except FuturesTimeoutError:
+        copilot_logger.info("Full-text search timed out, continuing without it.")
+        complete = False
+    except Exception as e:
+        # If full-text search fails, continue with metadata search only
+        copilot_logger.info(f"Full-text search failed: {str(e)}")
+        complete = False
+    timings["full_text"] = time.perf_counter() - started
+    
+    copilot_logger.info(
+        "Retriever stages finished at "
+        + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items())
+    )
+    
+    return texts, complete
+
+
+def retriever(query):
+    """
+    Retrieves SEC filings using SEC-API and processes them to answer questions.
+    Uses both filing metadata and full-text search for comprehensive results.
+    Financial statements are extracted from the filing tables as structured
+    rows, with a text-matching fallback when no statement tables are found.
+
+    The assembled context is cached per normalized question, and the cache
+    warmer keeps the contexts of frequently asked questions fresh.
+    """
+    try:
+        sec_api_key = get_configurations()["sec_api_key"]
+        get_cache_warmer().record_query(query)
+        
+        context_cache = get_context_cache()
+        context_key = normalize_question(query)
+        texts = context_cache.get(context_key)
+        if texts is None:
+            texts, complete = assemble_context(query, sec_api_key)
+            if texts and complete:
+                context_cache.put(context_key, texts)
         
         if not texts:
             return (
@@ -632,6 +892,15 @@ def retriever(query):
 
         # Use LangChain to process the query with the SEC filing context
         model = get_openai_model()
+        
+        # Same question over the same filing context: reuse the earlier answer
+        answer_cache = get_answer_cache()
+        cache_key = answer_cache_key(query, texts, model.model_name, PROMPT_VERSION)
+        cached_answer = answer_cache.get(cache_key)
+        if cached_answer is not None:
+            copilot_logger.info("Answer cache hit for retriever query.")
+            return cached_answer
+        
         chain = RunnableParallel({
             "question": lambda x: x["question"],
             "context": lambda x: x["context"]
@@ -642,6 +911,9 @@ def retriever(query):
             "context": texts
         })
         
+        if answer:
+            answer_cache.put(cache_key, answer)
+        
         return answer
         
     except Exception as e:
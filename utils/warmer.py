@@ -0,0 +1,272 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import logging
+copilot_logger = logging.getLogger("copilot")
+
+from utils.cache import get_context_cache, normalize_question, RETRIEVER_CONTEXT_TTL_SECONDS
+from utils.quotes import get_quote_service, QUOTE_TTL_SECONDS, QUOTE_MAX_BATCH_SIZE
+
+
+# The warmer wakes up this often and refreshes the hottest quotes and
+# retriever contexts that would expire before it runs again
+WARMER_ENABLED = os.environ.get("WARMER_ENABLED", "true").lower() == "true"
+WARMER_INTERVAL_SECONDS = int(os.environ.get("WARMER_INTERVAL_SECONDS", 60))
+
+# Upstream requests per cycle. Due quotes cost one batch download per
+# QUOTE_MAX_BATCH_SIZE tickers; a retriever context costs every call
+# assemble_context can make (see context_request_cost)
+WARMER_MAX_REQUESTS_PER_CYCLE = int(os.environ.get("WARMER_MAX_REQUESTS_PER_CYCLE", 20))
+WARMER_TOP_TICKERS = int(os.environ.get("WARMER_TOP_TICKERS", 30))
+WARMER_TOP_QUERIES = int(os.environ.get("WARMER_TOP_QUERIES", 10))
+
+# Request counts halve every half-life, so yesterday's names fade out;
+# names below the minimum score were asked once and are not worth warming
+WARMER_HALF_LIFE_SECONDS = int(os.environ.get("WARMER_HALF_LIFE_SECONDS", 3600))
+WARMER_MIN_SCORE = float(os.environ.get("WARMER_MIN_SCORE", 2))
+WARMER_MAX_TRACKED = 1000
+
+# Entries are refreshed once this fraction of their TTL is left
+WARMER_REFRESH_AHEAD = 0.25
+
+# Contexts are built off the warmer thread; a cycle waits this long for them
+# and starts no more after that, so quote refreshes keep their schedule
+WARMER_CONTEXT_WORKERS = 2
+WARMER_CONTEXT_SECONDS_PER_CYCLE = float(os.environ.get("WARMER_CONTEXT_SECONDS_PER_CYCLE", 30))
+
+
+def context_request_cost():
+    """Upstream calls one assemble_context can make: metadata search, filing downloads, full-text search."""
+    from utils.tools import MAX_FILINGS_PER_QUERY
+    return MAX_FILINGS_PER_QUERY + 2
+
+
+class DecayingCounter:
+    """
+    Request frequencies with exponential decay. Each key keeps a score and
+    the time it was last updated; scores are decayed lazily when read. The
+    lowest-scoring keys are dropped once more than max_keys are tracked.
+    """
+
+    def __init__(self, half_life=WARMER_HALF_LIFE_SECONDS, max_keys=WARMER_MAX_TRACKED):
+        self.half_life = half_life
+        self.max_keys = max_keys
+        self._scores = {}  # key -> (score, updated_at)
+        self._lock = threading.Lock()
+
+    def _decayed(self, entry, now):
+        score, updated_at = entry
+        return score * 0.5 ** ((now - updated_at) / self.half_life)
+
+    def add(self, key, count=1.0):
+        now = time.time()
+        with self._lock:
+            entry = self._scores.get(key)
+            score = self._decayed(entry, now) if entry is not None else 0.0
+            self._scores[key] = (score + count, now)
+            if len(self._scores) > self.max_keys:
+                self._prune(now)
+
+    def _prune(self, now):
+        # Caller holds self._lock; keep the top half
+        ranked = sorted(self._scores, key=lambda k: self._decayed(self._scores[k], now), reverse=True)
+        for key in ranked[self.max_keys // 2:]:
+            del self._scores[key]
+
+    def top(self, k, min_score=0.0):
+        """The k highest-scoring keys with their decayed scores, hottest first."""
+        now = time.time()
+        with self._lock:
+            scored = [(key, self._decayed(entry, now)) for key, entry in self._scores.items()]
+        scored = [(key, score) for key, score in scored if score >= min_score]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:k]
+
+    def __len__(self):
+        return len(self._scores)
+
+
+class CacheWarmer:
+    """
+    Learns the most requested tickers and retriever questions and keeps
+    their quotes and assembled contexts fresh in a background thread, so
+    hot names are not served cold.
+
+    A request counts as a warm hit when it is served from an entry the
+    warmer refreshed; warm_hit_rate is the share of requests that would
+    otherwise have gone upstream.
+    """
+
+    def __init__(self, interval=WARMER_INTERVAL_SECONDS, max_requests=WARMER_MAX_REQUESTS_PER_CYCLE):
+        self.interval = interval
+        self.max_requests = max_requests
+        self.tickers = DecayingCounter()
+        self.queries = DecayingCounter()
+        # Canonical question -> the wording it was first asked with
+        self._query_text = {}
+        # Entries whose current cached value came from the warmer
+        self._warmed = set()
+        self._lock = threading.Lock()
+        # Contexts being built, so a slow build is not started again next cycle
+        self._building = set()
+        self._context_executor = ThreadPoolExecutor(
+            max_workers=WARMER_CONTEXT_WORKERS, thread_name_prefix="cache-warmer-context"
+        )
+        self._thread = None
+        self._stop = threading.Event()
+        self.requests = 0
+        self.hits = 0
+        self.warm_hits = 0
+        self.cycles = 0
+        self.quotes_refreshed = 0
+        self.contexts_refreshed = 0
+
+    def _record(self, key, hit):
+        with self._lock:
+            self.requests += 1
+            if hit:
+                self.hits += 1
+                if key in self._warmed:
+                    self.warm_hits += 1
+            else:
+                # The caller fetches it now; the next hit is not the warmer's doing
+                self._warmed.discard(key)
+
+    def record_quote(self, ticker):
+        ticker = ticker.strip().upper()
+        self.tickers.add(ticker)
+        age = get_quote_service().age(ticker)
+        self._record(("quote", ticker), age is not None and age < QUOTE_TTL_SECONDS)
+
+    def record_query(self, query):
+        key = normalize_question(query)
+        self.queries.add(key)
+        with self._lock:
+            if key not in self._query_text and len(self._query_text) < WARMER_MAX_TRACKED:
+                self._query_text[key] = query
+        self._record(("context", key), get_context_cache().expires_in(key) > 0)
+
+    def _due_quotes(self):
+        service = get_quote_service()
+        due = []
+        for ticker, _ in self.tickers.top(WARMER_TOP_TICKERS, WARMER_MIN_SCORE):
+            age = service.age(ticker)
+            if age is None or age > QUOTE_TTL_SECONDS * (1 - WARMER_REFRESH_AHEAD):
+                due.append(ticker)
+        return due
+
+    def _due_queries(self):
+        cache = get_context_cache()
+        return [
+            key for key, _ in self.queries.top(WARMER_TOP_QUERIES, WARMER_MIN_SCORE)
+            if cache.expires_in(key) < RETRIEVER_CONTEXT_TTL_SECONDS * WARMER_REFRESH_AHEAD
+        ]
+
+    def warm_once(self):
+        """Refresh what is due, hottest first, within the per-cycle request budget."""
+        budget = self.max_requests
+
+        # Due quotes are fetched together, one download per QUOTE_MAX_BATCH_SIZE tickers
+        tickers = self._due_quotes()[:budget * QUOTE_MAX_BATCH_SIZE]
+        if tickers:
+            get_quote_service().refresh(tickers)
+            budget -= -(-len(tickers) // QUOTE_MAX_BATCH_SIZE)
+            with self._lock:
+                self.quotes_refreshed += len(tickers)
+                self._warmed.update(("quote", ticker) for ticker in tickers)
+
+        # Contexts are built with the server's SEC API key; without one only quotes are warmed
+        sec_api_key = os.environ.get("SEC_API_KEY")
+        cost = context_request_cost()
+        if sec_api_key and budget >= cost:
+            with self._lock:
+                # Builds still running from an earlier cycle use up this cycle's budget too
+                budget -= cost * len(self._building)
+                keys = [key for key in self._due_queries() if key not in self._building]
+                keys = keys[:max(budget, 0) // cost]
+                self._building.update(keys)
+
+            futures = [self._context_executor.submit(self._build_context, key, sec_api_key) for key in keys]
+            wait(futures, timeout=WARMER_CONTEXT_SECONDS_PER_CYCLE)
+            for key, future in zip(keys, futures):
+                # Builds not started by now wait for a later cycle; running ones finish in the background
+                if future.cancel():
+                    with self._lock:
+                        self._building.discard(key)
+
+        with self._lock:
+            self.cycles += 1
+
+    def _build_context(self, key, sec_api_key):
+        from utils.tools import assemble_context
+
+        with self._lock:
+            query = self._query_text.get(key, key)
+        try:
+            texts, complete = assemble_context(query, sec_api_key)
+            if texts and complete:
+                get_context_cache().put(key, texts)
+                with self._lock:
+                    self.contexts_refreshed += 1
+                    self._warmed.add(("context", key))
+        except Exception as e:
+            copilot_logger.error(f"Cache warmer failed to build context for '{query}': {str(e)}")
+        finally:
+            with self._lock:
+                self._building.discard(key)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.warm_once()
+                copilot_logger.info(f"Cache warmer: {self.stats()}")
+            except Exception as e:
+                copilot_logger.error(f"Cache warmer cycle failed: {str(e)}")
+
+    def start(self):
+        """Start the background thread; calling it again is a no-op."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name="cache-warmer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hits": self.hits,
+                "warm_hits": self.warm_hits,
+                "hit_rate": self.hits / self.requests if self.requests else 0.0,
+                "warm_hit_rate": self.warm_hits / self.requests if self.requests else 0.0,
+                "cycles": self.cycles,
+                "quotes_refreshed": self.quotes_refreshed,
+                "contexts_refreshed": self.contexts_refreshed,
+                "tracked_tickers": len(self.tickers),
+                "tracked_queries": len(self.queries),
+            }
+
+
+_cache_warmer = None
+_cache_warmer_lock = threading.Lock()
+
+
+def get_cache_warmer():
+    """Return the process-wide CacheWarmer; it only records until started."""
+    global _cache_warmer
+    if _cache_warmer is None:
+        with _cache_warmer_lock:
+            if _cache_warmer is None:
+                _cache_warmer = CacheWarmer()
+    return _cache_warmer
+
+
+def start_cache_warmer():
+    """Start the process-wide warmer once per server process (see WARMER_ENABLED)."""
+    if WARMER_ENABLED:
+        get_cache_warmer().start()
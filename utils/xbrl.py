@@ -0,0 +1,343 @@
+import os
+import re
+import json
+import zipfile
+import threading
+from collections import OrderedDict
+
+import logging
+copilot_logger = logging.getLogger("copilot")
+
+from utils.cache import CACHE_DIR
+from utils.tickers import load_company_tickers, get_ticker_resolver
+
+
+# Parquet store of SEC companyfacts, one partition per company: <FACTS_DIR>/cik=<cik>/facts.parquet
+FACTS_DIR = os.environ.get("XBRL_FACTS_DIR", os.path.join(CACHE_DIR, "companyfacts"))
+
+# Companies kept decoded in memory by FactStore
+FACT_STORE_MAX_COMPANIES = 64
+
+# us-gaap concepts for the metric names used by the statement extractor, in priority order
+CONCEPT_ALIASES = {
+    'revenue': ['RevenueFromContractWithCustomerExcludingAssessedTax', 'Revenues', 'SalesRevenueNet',
+                'RevenueFromContractWithCustomerIncludingAssessedTax'],
+    'gross_profit': ['GrossProfit'],
+    'operating_expenses': ['OperatingExpenses'],
+    'operating_income': ['OperatingIncomeLoss'],
+    'net_income': ['NetIncomeLoss', 'ProfitLoss'],
+    'cash_and_equivalents': ['CashAndCashEquivalentsAtCarryingValue'],
+    'total_current_assets': ['AssetsCurrent'],
+    'total_assets': ['Assets'],
+    'total_current_liabilities': ['LiabilitiesCurrent'],
+    'total_liabilities': ['Liabilities'],
+    'stockholders_equity': ['StockholdersEquity'],
+    'operating_cash_flow': ['NetCashProvidedByUsedInOperatingActivities'],
+    'investing_cash_flow': ['NetCashProvidedByUsedInInvestingActivities'],
+    'financing_cash_flow': ['NetCashProvidedByUsedInFinancingActivities'],
+}
+
+# SEC "frames" identify the one canonical fact per period, e.g. CY2023, CY2023Q2, CY2023Q2I
+PERIOD_FRAMES = {
+    'annual': re.compile(r'^CY\d{4}$'),
+    'quarterly': re.compile(r'^CY\d{4}Q\d$'),
+    'instant': re.compile(r'^CY\d{4}Q\dI$'),
+}
+
+
+def _fact_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ('cik', pa.int64()),
+        ('entity_name', pa.string()),
+        ('taxonomy', pa.string()),
+        ('concept', pa.string()),
+        ('unit', pa.string()),
+        ('value', pa.float64()),
+        ('start', pa.string()),
+        ('end', pa.string()),
+        ('fy', pa.int64()),
+        ('fp', pa.string()),
+        ('form', pa.string()),
+        ('filed', pa.string()),
+        ('frame', pa.string()),
+        ('accn', pa.string()),
+    ])
+
+
+def iter_fact_rows(company_facts):
+    """Flatten one companyfacts JSON document into fact rows."""
+    cik = int(company_facts['cik'])
+    entity_name = company_facts.get('entityName')
+
+    for taxonomy, concepts in company_facts.get('facts', {}).items():
+        for concept, details in concepts.items():
+            for unit, facts in details.get('units', {}).items():
+                for fact in facts:
+                    yield {
+                        'cik': cik,
+                        'entity_name': entity_name,
+                        'taxonomy': taxonomy,
+                        'concept': concept,
+                        'unit': unit,
+                        'value': float(fact['val']),
+                        'start': fact.get('start'),
+                        'end': fact.get('end'),
+                        'fy': fact.get('fy'),
+                        'fp': fact.get('fp'),
+                        'form': fact.get('form'),
+                        'filed': fact.get('filed'),
+                        'frame': fact.get('frame'),
+                        'accn': fact.get('accn'),
+                    }
+
+
+def _iter_company_facts(source):
+    """Yield parsed companyfacts documents from a JSON file, a directory of them, or the bulk zip."""
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.endswith('.json'):
+                with open(os.path.join(source, name), 'rb') as f:
+                    yield json.load(f)
+    elif zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for name in archive.namelist():
+                if name.endswith('.json'):
+                    yield json.loads(archive.read(name))
+    else:
+        with open(source, 'rb') as f:
+            yield json.load(f)
+
+
+def ingest_company_facts(source, tickers_path=None, facts_dir=FACTS_DIR):
+    """
+    Load SEC companyfacts JSON dumps from local files into the Parquet store.
+    Each company is written to its own partition, replacing any previous
+    version. Returns the number of companies ingested.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(facts_dir, exist_ok=True)
+    schema = _fact_schema()
+    ingested = 0
+
+    for company_facts in _iter_company_facts(source):
+        if 'cik' not in company_facts:
+            continue
+        rows = list(iter_fact_rows(company_facts))
+        if not rows:
+            continue
+
+        partition = os.path.join(facts_dir, f"cik={int(company_facts['cik'])}")
+        os.makedirs(partition, exist_ok=True)
+        path = os.path.join(partition, "facts.parquet")
+
+        # Write to a temporary file first so readers never see a partial partition
+        pq.write_table(pa.Table.from_pylist(rows, schema=schema), path + ".tmp", compression="zstd")
+        os.replace(path + ".tmp", path)
+        ingested += 1
+
+    if tickers_path:
+        tickers = {}
+        for cik, ticker, _ in load_company_tickers(tickers_path):
+            tickers.setdefault(ticker, cik)
+        with open(os.path.join(facts_dir, "tickers.json"), "w") as f:
+            json.dump(tickers, f)
+
+    copilot_logger.info(f"Ingested company facts for {ingested} companies into {facts_dir}")
+    return ingested
+
+
+class FactStore:
+    """
+    Query layer over the Parquet company facts store.
+    Company partitions are decoded once and kept in a small LRU, so repeated
+    lookups for the same issuer are served from memory.
+    """
+
+    def __init__(self, facts_dir=FACTS_DIR, max_companies=FACT_STORE_MAX_COMPANIES):
+        self.facts_dir = facts_dir
+        self.max_companies = max_companies
+        self._tables = OrderedDict()
+        self._tickers = None
+        self._lock = threading.Lock()
+
+    def resolve_cik(self, ticker_or_cik):
+        """Return the CIK for a ticker (or a CIK passed through), or None if unknown."""
+        if isinstance(ticker_or_cik, int) or str(ticker_or_cik).isdigit():
+            return int(ticker_or_cik)
+
+        if self._tickers is None:
+            path = os.path.join(self.facts_dir, "tickers.json")
+            try:
+                with open(path) as f:
+                    self._tickers = json.load(f)
+            except (OSError, ValueError):
+                self._tickers = {}
+
+        cik = self._tickers.get(str(ticker_or_cik).upper())
+        if cik is None:
+            resolution = get_ticker_resolver().lookup_ticker(str(ticker_or_cik))
+            cik = resolution.cik if resolution else None
+        return cik
+
+    def _company_table(self, cik):
+        path = os.path.join(self.facts_dir, f"cik={cik}", "facts.parquet")
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            cached = self._tables.get(cik)
+            if cached is not None and cached[0] == mtime:
+                self._tables.move_to_end(cik)
+                return cached[1]
+
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+
+        with self._lock:
+            self._tables[cik] = (mtime, table)
+            self._tables.move_to_end(cik)
+            while len(self._tables) > self.max_companies:
+                self._tables.popitem(last=False)
+
+        return table
+
+    def has_company(self, ticker_or_cik):
+        cik = self.resolve_cik(ticker_or_cik)
+        return cik is not None and os.path.exists(
+            os.path.join(self.facts_dir, f"cik={cik}", "facts.parquet")
+        )
+
+    def query(self, ticker_or_cik, concept, unit=None, form=None, fiscal_year=None, fiscal_period=None):
+        """Return every fact for a concept as a list of dicts, ordered by period end."""
+        import pyarrow.compute as pc
+
+        cik = self.resolve_cik(ticker_or_cik)
+        table = self._company_table(cik) if cik is not None else None
+        if table is None:
+            return []
+
+        mask = pc.equal(table['concept'], concept)
+        if unit is not None:
+            mask = pc.and_(mask, pc.equal(table['unit'], unit))
+        if form is not None:
+            mask = pc.and_(mask, pc.equal(table['form'], form))
+        if fiscal_year is not None:
+            mask = pc.and_(mask, pc.equal(table['fy'], int(fiscal_year)))
+        if fiscal_period is not None:
+            mask = pc.and_(mask, pc.equal(table['fp'], fiscal_period))
+
+        rows = table.filter(mask).to_pylist()
+        rows.sort(key=lambda row: (row['end'] or '', row['filed'] or ''))
+        return rows
+
+    def metric_series(self, ticker_or_cik, metric, period_type=None, unit="USD"):
+        """
+        Time series for a metric name (e.g. 'revenue') or raw concept, with one
+        canonical fact per period. period_type is 'annual', 'quarterly',
+        'instant' or None for all of them.
+        """
+        frame_pattern = PERIOD_FRAMES.get(period_type)
+
+        for concept in CONCEPT_ALIASES.get(metric, [metric]):
+            series = [
+                row for row in self.query(ticker_or_cik, concept, unit=unit)
+                if row['frame'] and (frame_pattern is None or frame_pattern.match(row['frame']))
+            ]
+            if series:
+                return series
+        return []
+
+    def latest_values(self, ticker_or_cik, period_type="annual", metrics=None):
+        """
+        Latest value of each metric for the period type. Balance sheet metrics
+        are point-in-time, so the latest instant fact is used for them.
+        Returns {metric: fact}.
+        """
+        latest = {}
+        for metric in metrics or CONCEPT_ALIASES:
+            series = self.metric_series(ticker_or_cik, metric)
+            if not series:
+                continue
+            if series[-1]['start'] is None:
+                series = [row for row in series if PERIOD_FRAMES['instant'].match(row['frame'])]
+            else:
+                series = [row for row in series if PERIOD_FRAMES[period_type].match(row['frame'])]
+            if series:
+                latest[metric] = series[-1]
+        return latest
+
+    def latest_filing(self, ticker_or_cik, form_type="10-K"):
+        """Describe the most recent filing of a form type seen in the facts, or None."""
+        import pyarrow.compute as pc
+
+        cik = self.resolve_cik(ticker_or_cik)
+        table = self._company_table(cik) if cik is not None else None
+        if table is None:
+            return None
+
+        filings = table.filter(pc.equal(table['form'], form_type))
+        if not filings.num_rows:
+            return None
+
+        # Filings repeat prior-period comparatives, so the filing's own period
+        # is the latest period end among the facts of its accession
+        index = pc.index(filings['filed'], pc.max(filings['filed'])).as_py()
+        accn = filings['accn'][index].as_py()
+        filing = filings.filter(pc.equal(filings['accn'], accn))
+        index = pc.index(filing['end'], pc.max(filing['end'])).as_py()
+        return filing.slice(index, 1).to_pylist()[0]
+
+    def filing_dates(self, ticker_or_cik, forms=("10-K", "10-Q")):
+        """Distinct (filed date, form) pairs of the given forms seen in the facts, oldest first."""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        cik = self.resolve_cik(ticker_or_cik)
+        table = self._company_table(cik) if cik is not None else None
+        if table is None:
+            return []
+
+        filings = table.filter(pc.is_in(table['form'], value_set=pa.array(list(forms))))
+        pairs = {
+            (row['filed'], row['form'])
+            for row in filings.select(['filed', 'form']).to_pylist() if row['filed']
+        }
+        return sorted(pairs)
+
+
+def filing_index_url(cik, accn):
+    """EDGAR folder URL for an accession number."""
+    return f"https://www.sec.gov/Archives/edgar/data/{int(cik)}/{accn.replace('-', '')}/"
+
+
+_fact_store = None
+_fact_store_lock = threading.Lock()
+
+
+def get_fact_store():
+    """Return the process-wide FactStore, creating it on first use."""
+    global _fact_store
+    if _fact_store is None:
+        with _fact_store_lock:
+            if _fact_store is None:
+                _fact_store = FactStore()
+    return _fact_store
+
+
+if __name__ == "__main__":
+    # Usage: python -m utils.xbrl <companyfacts.zip | dir | CIK.json> [company_tickers.json]
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    copilot_logger.setLevel(logging.INFO)
+
+    if len(sys.argv) < 2:
+        print("Usage: python -m utils.xbrl <companyfacts.zip | dir | CIK.json> [company_tickers.json]")
+        sys.exit(1)
+
+    ingest_company_facts(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)